@@ -167,26 +167,31 @@ export default function ContractGenerator() {
     formData.append('file', file)
 
     try {
-      // Simulate progress for better UX
-      const progressInterval = setInterval(() => {
-        setProgress(prev => {
-          const newProgress = prev + Math.random() * 10
-          return newProgress > 90 ? 90 : newProgress
-        })
-      }, 500)
-
       const response = await fetch('http://localhost:8000/generate_contract/', {
         method: 'POST',
         body: formData,
       })
 
-      clearInterval(progressInterval)
-
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`)
       }
 
-      const data = await response.json()
+      // The server queues the work; poll the job for its real progress
+      let job = await response.json()
+      while (job.status !== 'done') {
+        if (job.status === 'failed') {
+          throw new Error(job.error || 'Contract generation failed')
+        }
+        setProgress(job.progress)
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        const poll = await fetch(job.status_url)
+        if (!poll.ok) {
+          throw new Error(`HTTP error! status: ${poll.status}`)
+        }
+        job = await poll.json()
+      }
+
+      const data = job.result
       setProgress(100)
 
       // Format the contract data for display
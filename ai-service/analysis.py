@@ -0,0 +1,214 @@
+import os
+import time
+import zlib
+import asyncio
+import hashlib
+
+from cache import ResponseCache
+from scheduler import ANALYSIS, MAP
+
+# Target size of one map chunk, in estimated prompt tokens
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "2048"))
+# Cap on each partial analysis, so the reduce prompt stays small
+ANALYSIS_MAP_TOKENS = int(os.getenv("ANALYSIS_MAP_TOKENS", "384"))
+# Partials combined per reduce prompt; more than this are reduced in rounds
+ANALYSIS_REDUCE_FANIN = int(os.getenv("ANALYSIS_REDUCE_FANIN", "8"))
+# Most recent chunks analysed; older history beyond this is left out. Chunks
+# close between 3/4 full and full, so the default 16 covers roughly the last
+# 25-32k tokens of the chat
+ANALYSIS_MAX_CHUNKS = int(os.getenv("ANALYSIS_MAX_CHUNKS", "16"))
+# Stored partial analyses, reused by later analyses of the same chat
+ANALYSIS_STORE_SIZE = int(os.getenv("ANALYSIS_STORE_SIZE", "20000"))
+ANALYSIS_STORE_TTL = float(os.getenv("ANALYSIS_STORE_TTL", "86400"))
+
+# A chunk may close after any message whose hash is 0 modulo this, once it
+# holds this share of ANALYSIS_CHUNK_TOKENS
+_BOUNDARY_MODULUS = 4
+_BOUNDARY_FILL = 0.75
+
+
+def map_prompt(chunk: list, index: int, total: int) -> str:
+    conversation = "\n".join(chunk)
+    return f"""
+You are Accord, an advanced AI psychologist and communication analyst. You are reading part {index} of {total} of a longer conversation. Do not take sides.
+
+Write compact notes on this part only, under three headings:
+- Topics: what was discussed and who said what.
+- Emotions: the underlying emotions of each participant, with one or two short quotes as evidence.
+- Dynamics: dominance, misunderstandings, collaboration or conflict you can see.
+
+**Conversation (part {index} of {total}):**
+{conversation}
+---
+Notes:
+"""
+
+
+def combine_prompt(partials: list) -> str:
+    notes = "\n\n".join(f"### Notes {i}\n{text}" for i, text in enumerate(partials, 1))
+    return f"""
+You are Accord, an advanced AI psychologist and communication analyst. Merge the following notes on consecutive parts of one conversation into a single set of notes with the same three headings (Topics, Emotions, Dynamics). Keep the most telling quotes and drop repetition.
+
+{notes}
+---
+Merged notes:
+"""
+
+
+def reduce_prompt(partials: list) -> str:
+    notes = "\n\n".join(f"### Part {i}\n{text}" for i, text in enumerate(partials, 1))
+    return f"""
+You are Accord, an advanced AI psychologist and communication analyst. Below are notes on consecutive parts of one conversation, in order. Using them, perform a deep, unbiased analysis of the whole conversation. Do not take sides. Your analysis should be structured into three parts:
+
+1.  **Interaction Summary:** Briefly summarize the main topics of discussion and who said what.
+2.  **Emotional Tone Analysis:** Identify the underlying emotions (e.g., frustration, excitement, confusion) for each participant. Provide brief quotes as evidence.
+3.  **Psychological Dynamics:** Analyze the communication patterns. Is one person more dominant? Is there a misunderstanding? Are there signs of collaboration or conflict?
+
+**Notes on the conversation:**
+{notes}
+---
+Provide your analysis now:
+"""
+
+
+def split_chunks(lines: list, max_tokens: int, estimate) -> list:
+    """
+    Splits messages into consecutive chunks of at most `max_tokens` each.
+
+    Boundaries are content-defined: once a chunk is 3/4 full it closes
+    after the next message whose hash hits the boundary condition. A cut
+    therefore depends only on nearby messages, so appending new messages
+    or dropping old ones from the front leaves the other chunks unchanged
+    and their stored partial analyses reusable.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for line in lines:
+        cost = estimate(line) + 1
+        if current and used + cost > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += cost
+        if used >= max_tokens * _BOUNDARY_FILL and zlib.crc32(line.encode("utf-8")) % _BOUNDARY_MODULUS == 0:
+            chunks.append(current)
+            current, used = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def content_key(scope: str, kind: str, parts: list) -> str:
+    digest = hashlib.sha256()
+    for part in [scope, kind, *parts]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MapReduceAnalyzer:
+    """
+    Deep analysis of conversations too long for one prompt. The history is
+    split into size-bounded chunks that are analysed concurrently (each map
+    and merge call takes a slot in the scheduler's map lane, so up to
+    LLM_MAP_CONCURRENCY run at once), the partial notes are merged in
+    rounds of ANALYSIS_REDUCE_FANIN if there are many, and a final streamed
+    generation turns them into the three-part report. The request was
+    admitted once, so its map and reduce calls queue without being rejected.
+
+    Map and merge results are stored keyed by chat id and a hash of their
+    input messages. A repeat analysis of a chat only regenerates chunks
+    whose content changed, plus the merges above them and the final report.
+    """
+
+    def __init__(self, ollama, scheduler, estimator, model: str, options: dict,
+                 chunk_tokens=ANALYSIS_CHUNK_TOKENS, map_tokens=ANALYSIS_MAP_TOKENS,
+                 fanin=ANALYSIS_REDUCE_FANIN, max_chunks=ANALYSIS_MAX_CHUNKS, store=None):
+        self.ollama = ollama
+        self.scheduler = scheduler
+        self.estimator = estimator
+        self.model = model
+        self.options = options
+        self.chunk_tokens = chunk_tokens
+        self.map_tokens = map_tokens
+        self.fanin = max(fanin, 2)
+        self.max_chunks = max_chunks
+        self.store = store if store is not None else ResponseCache(ANALYSIS_STORE_SIZE, ANALYSIS_STORE_TTL)
+
+    def chunks(self, lines: list) -> list:
+        """The most recent `max_chunks` chunks of the history."""
+        return split_chunks(lines, self.chunk_tokens, self.estimator.estimate)[-self.max_chunks:]
+
+    def _payload(self, prompt: str, stream: bool, max_tokens: int = None) -> dict:
+        options = dict(self.options)
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        return {"model": self.model, "prompt": prompt, "stream": stream, "options": options}
+
+    async def _generate(self, prompt: str, key: str) -> tuple:
+        """
+        One bounded generation in a map-lane slot, or its stored result.
+        Returns (text, queue wait, reused).
+        """
+        stored = self.store.get(key)
+        if stored is not None:
+            return stored, 0.0, True
+        async with self.scheduler.slot(MAP, admitted=True) as waited:
+            result = await self.ollama.generate(self._payload(prompt, False, self.map_tokens))
+        text = result.get("response", "").strip()
+        if text:
+            self.store.set(key, text)
+        return text, waited, False
+
+    async def map(self, chunks: list, scope: str = "") -> list:
+        """Analyses every chunk concurrently; returns (text, queue wait, reused) per chunk."""
+        # The chunk position is part of the map prompt, but not of the key:
+        # the notes describe the messages, wherever the chunk now falls.
+        total = len(chunks)
+        return await asyncio.gather(*(
+            self._generate(map_prompt(chunk, i, total), content_key(scope, "map", chunk))
+            for i, chunk in enumerate(chunks, 1)
+        ))
+
+    async def combine(self, partials: list, scope: str = "") -> list:
+        """Merges partials in groups until one reduce prompt can hold them."""
+        while len(partials) > self.fanin:
+            groups = [partials[i:i + self.fanin] for i in range(0, len(partials), self.fanin)]
+            results = await asyncio.gather(*(
+                self._generate(combine_prompt(group), content_key(scope, "combine", group))
+                if len(group) > 1 else self._passthrough(group[0])
+                for group in groups
+            ))
+            partials = [text for text, _, _ in results]
+        return partials
+
+    async def _passthrough(self, text: str) -> tuple:
+        return text, 0.0, True
+
+    async def analyze(self, lines: list, scope: str = ""):
+        """
+        Yields `{"meta": ...}` and then the Ollama frames of the final,
+        streamed reduce generation. `scope` (the chat id) namespaces the
+        stored partial results.
+        """
+        started = time.perf_counter()
+        chunks = self.chunks(lines)
+        mapped = await self.map(chunks, scope)
+        partials = await self.combine([text for text, _, _ in mapped], scope)
+        map_wait = max((waited for _, waited, _ in mapped), default=0.0)
+        prompt = reduce_prompt(partials)
+
+        async with self.scheduler.slot(ANALYSIS, admitted=True) as waited:
+            yield {"meta": {
+                "strategy": "map_reduce",
+                "chunks": len(chunks),
+                "chunks_reused": sum(1 for _, _, reused in mapped if reused),
+                "history_messages": sum(len(chunk) for chunk in chunks),
+                "history_messages_dropped": len(lines) - sum(len(chunk) for chunk in chunks),
+                "map_ms": round((time.perf_counter() - started) * 1000, 1),
+                "queue_wait_ms": round((map_wait + waited) * 1000, 1),
+                "prompt_tokens_estimated": self.estimator.estimate(prompt),
+            }}
+            async for frame in self.ollama.stream(self._payload(prompt, True)):
+                yield frame
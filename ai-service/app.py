@@ -1,25 +1,182 @@
 # File: ai-service/app.py
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-import requests
+from typing import ClassVar, Optional
+import asyncio
+import functools
+import httpx
 import json
+import logging
+import os
 import re
+import time
+
+from ollama_client import OllamaClient, ResponseAccumulator
+from backend_pool import BackendPool
+from cache import ResponseCache, make_key, normalize_text
+from embeddings import Embedder
+from semantic_cache import SemanticCache
+from retrieval import MessageIndex
+from coalesce import SingleFlight
+from memory import (ChatMemory, MemoryView, summary_prompt, render_history, MEMORY_SUMMARY_TOKENS,
+                    MEMORY_SUMMARY_MAX_BATCHES)
+from budget import TokenEstimator, GenerationPlanner, pack_history, LLM_NUM_CTX, PROMPT_BUDGETS
+from scheduler import Scheduler, SchedulerRejected, INTERACTIVE, ANALYSIS, BATCH
+import metrics
+from analysis import MapReduceAnalyzer
+from warmup import ModelKeeper
+from router import ModelRouter, Route, SMALL
+
+logger = logging.getLogger(__name__)
+
+MODEL = "llama3:instruct"
+GENERATE_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "num_ctx": LLM_NUM_CTX
+}
+
+# How long a request may take before its generation is abandoned. The socket
+# server gives up on /ask after 30 s, so stop just before that.
+REQUEST_TIMEOUTS = {
+    "ask": float(os.getenv("ASK_TIMEOUT", "28")),
+    "analysis": float(os.getenv("ANALYSIS_TIMEOUT", "300")),
+    "analyze": float(os.getenv("ANALYZE_TIMEOUT", "28")),
+}
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# /ask/batch: items per call, items of one call generating at once, and the
+# time each item may take (batch items wait behind interactive traffic)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "300"))
+
+class ClientDisconnected(Exception):
+    """The caller went away before the answer was ready."""
+
+class IndexedMessage(BaseModel):
+    id: str
+    text: str
+
+class IndexRequest(BaseModel):
+    chat_id: str
+    messages: list[IndexedMessage]
 
 class AskRequest(BaseModel):
     history: str = ""
     question: str
     analysis_mode: bool = False
+    no_cache: bool = False
+    # Stable id of the conversation (e.g. "group:42"); enables summary memory
+    chat_id: Optional[str] = None
+    # How long the caller will wait, in ms; the X-Deadline-Ms header overrides it
+    deadline_ms: Optional[int] = None
 
-app = FastAPI()
+class AnalyzeRequest(BaseModel):
+    """
+    Body of /analyze, the contract of the former Flask chat_analyzer
+    service. It runs through the same pipeline as /ask, with its own prompt.
+    """
+    chat_data: str = ""
+    user_prompt: str = ""
+    no_cache: bool = False
+    chat_id: Optional[str] = None
+    deadline_ms: Optional[int] = None
+    analysis_mode: ClassVar[bool] = False
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+    @property
+    def history(self) -> str:
+        return self.chat_data
 
-@app.post("/ask")
-async def ask_ai(request: AskRequest):
-    chat_history = request.history
+    @property
+    def question(self) -> str:
+        return self.user_prompt
+
+class BatchRequest(BaseModel):
+    items: list[AskRequest]
+
+# Ollama instances, routed by least outstanding requests
+backends = BackendPool()
+
+# One pooled client per worker, shared by every request
+ollama = OllamaClient(backends)
+
+# Answers for repeated questions over an unchanged history
+response_cache = ResponseCache()
+
+# One sentence-transformers model for everything embedded in this service
+embedder = Embedder()
+
+# Answers reused for reworded questions over the same history
+semantic_cache = SemanticCache(embedder)
+
+# Per-chat message embeddings, searched for context relevant to a question
+message_index = MessageIndex(embedder)
+
+# Identical concurrent requests share one upstream generation
+inflight = SingleFlight()
+
+# Rolling summary of older messages per chat
+chat_memory = ChatMemory()
+
+# Summary catch-ups running in the background, by chat id
+summary_tasks = {}
+
+# Prompt token estimates, calibrated from Ollama's prompt_eval_count
+token_estimator = TokenEstimator()
+
+# Generation limits that fit the caller's deadline, from measured backend speeds
+planner = GenerationPlanner()
+
+# Trivial questions go to a smaller, faster model
+router = ModelRouter(MODEL, token_estimator.estimate)
+
+# Bounded, prioritized access to the model backend
+scheduler = Scheduler()
+
+# Loads the model at startup and keeps it resident during business hours
+keeper = ModelKeeper(backends)
+
+# Chunked, concurrent analysis for histories too long for one prompt
+analyzer = MapReduceAnalyzer(ollama, scheduler, token_estimator, MODEL, GENERATE_OPTIONS)
+
+metrics.register_stats(cache=response_cache, semantic_cache=semantic_cache,
+                       message_index=message_index, scheduler=scheduler, backends=backends,
+                       router=router)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    backends.start_health_checks()
+    keeper.start()
+    yield
+    keeper.stop()
+    for task in list(summary_tasks.values()):
+        task.cancel()
+    backends.stop_health_checks()
+    await ollama.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+def build_analyze_prompt(history: str, user_prompt: str) -> str:
+    return (
+        "You are a helpful AI assistant in a group chat. "
+        "Analyze the following chat history and answer the user's question. "
+        "Your response should be concise and based only on the provided conversation context.\n\n"
+        "--- CHAT HISTORY ---\n"
+        f"{history}\n\n"
+        "--- USER'S QUESTION ---\n"
+        f"{user_prompt}\n\n"
+        "--- YOUR RESPONSE ---\n"
+    )
+
+def build_prompt(request: AskRequest, chat_history: str) -> str:
     question = request.question.strip()
 
-    if request.analysis_mode:
+    if isinstance(request, AnalyzeRequest):
+        prompt = build_analyze_prompt(chat_history, request.user_prompt)
+    elif request.analysis_mode:
         # Deep analysis prompt
         prompt = f"""
 You are Accord, an advanced AI psychologist and communication analyst. Your task is to perform a deep, unbiased analysis of the following conversation. Do not take sides. Your analysis should be structured into three parts:
@@ -67,29 +224,706 @@ You are Accord, an AI assistant in a chat application. A user has tagged you wit
 
 **Your response:**
 """
+    return prompt
+
+def build_payload(prompt: str, stream: bool = False, limits: dict = None, model: str = MODEL) -> dict:
+    return {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {**GENERATE_OPTIONS, **(limits or {})},
+    }
+
+def request_mode(request: AskRequest) -> str:
+    if isinstance(request, AnalyzeRequest):
+        return "analyze"
+    return "analysis" if request.analysis_mode else "ask"
+
+def request_lane(request: AskRequest) -> str:
+    return ANALYSIS if request.analysis_mode else INTERACTIVE
+
+def cache_key(request: AskRequest) -> str:
+    return make_key(MODEL, GENERATE_OPTIONS, request_mode(request), request.history, request.question)
+
+async def question_vector(request: AskRequest):
+    """Embedding of the question, or None if it cannot be embedded."""
+    if request.analysis_mode or not request.question.strip() or not embedder.available:
+        return None
+    try:
+        return await embedder.aembed(normalize_text(request.question).lower())
+    except Exception:
+        # Embeddings are an optimization; fall through to the model
+        return None
+
+def semantic_scope(request: AskRequest):
+    """
+    The semantic cache scope: this chat and this exact history. None for a
+    question without history, whose near-duplicates ("what is 2+2", "what
+    is 2+3") are too likely to need different answers to share a scope.
+    """
+    if not request.history.strip():
+        return None
+    mode = f"{request_mode(request)}@{request.chat_id or ''}"
+    return make_key(MODEL, GENERATE_OPTIONS, mode, request.history, "")
+
+async def semantic_lookup(request: AskRequest) -> tuple:
+    """
+    Embeds the question and looks for one that means the same, already
+    answered in this chat over this exact history. Returns (vector, hit);
+    the vector is None when the question was not embedded, and the hit
+    None on a miss.
+    """
+    scope = semantic_scope(request)
+    use_cache = semantic_cache.enabled and not request.no_cache and scope is not None
+    vector = await question_vector(request) if use_cache or uses_retrieval(request) else None
+    if vector is None or not use_cache:
+        return vector, None
+    return vector, semantic_cache.lookup(scope, vector)
+
+def remember_answer(request: AskRequest, key: str, vector, answer: str):
+    response_cache.set(key, answer)
+    scope = semantic_scope(request)
+    if vector is not None and scope is not None:
+        semantic_cache.add(scope, vector, answer)
+
+def uses_retrieval(request: AskRequest) -> bool:
+    """True for a question about a chat whose messages have been indexed."""
+    return (message_index.enabled and not request.analysis_mode
+            and bool(request.chat_id) and message_index.size(request.chat_id) > 0)
+
+async def remembered_history(request: AskRequest, vector=None) -> MemoryView:
+    """
+    History to put in the prompt. With a chat_id, older messages are replaced
+    by the chat's rolling summary, which is brought up to date in the
+    background once enough unsummarized messages have accumulated. For a
+    question about an indexed chat, the unsummarized older messages are
+    replaced in turn by the indexed messages most relevant to the question.
+    """
+    if not request.chat_id or not request.history:
+        lines = [line for line in request.history.splitlines() if line.strip()]
+        return MemoryView("", [], lines, None)
+
+    view = await summarized_history(request)
+    if not uses_retrieval(request):
+        return view
+    if vector is None:
+        vector = await question_vector(request)
+        if vector is None:
+            return view
+    recent = {normalize_text(line) for line in view.recent}
+    relevant = message_index.search(request.chat_id, vector, exclude=recent)
+    return MemoryView(view.summary, relevant, view.recent, view.anchor, retrieved=True)
+
+async def summarized_history(request: AskRequest) -> MemoryView:
+    """
+    The chat's memory view. When its summary is due, a catch-up is started
+    in the background, at most one per chat, and this request is answered
+    from the pending messages verbatim (packed to the prompt budget like
+    any history); later requests get the updated summary.
+    """
+    chat_id = request.chat_id
+    view = chat_memory.view(chat_id, request.history)
+    if view.needs_summary and chat_id not in summary_tasks:
+        task = asyncio.create_task(catch_up_summary(chat_id, request.history))
+        summary_tasks[chat_id] = task
+        task.add_done_callback(lambda _: summary_tasks.pop(chat_id, None))
+    return view
+
+async def catch_up_summary(chat_id: str, history: str):
+    """
+    Folds the chat's backlog into its summary in bounded batches, oldest
+    first, recording each batch as soon as it is summarized. It is detached
+    from the request that started it, so the caller's deadline or hanging up
+    cannot cancel it, and each call waits for a slot in the batch lane,
+    behind interactive and analysis traffic.
+    """
+    async with chat_memory.lock(chat_id):
+        view = chat_memory.view(chat_id, history)
+        for _ in range(MEMORY_SUMMARY_MAX_BATCHES):
+            if not view.needs_summary:
+                break
+            lines, anchor = view.next_batch(token_estimator.estimate)
+            try:
+                async with scheduler.slot(BATCH, admitted=True):
+                    result = await ollama.generate({
+                        "model": MODEL,
+                        "prompt": summary_prompt(view.summary, lines),
+                        "stream": False,
+                        # Same num_ctx as the answer, or Ollama reloads the model between them
+                        "options": {"temperature": 0.2, "num_predict": MEMORY_SUMMARY_TOKENS,
+                                    "num_ctx": GENERATE_OPTIONS["num_ctx"]},
+                    })
+            except (httpx.HTTPError, ValueError) as e:
+                # The summary is an optimization; the pending messages stay verbatim
+                logger.warning(f"Could not update the summary of {chat_id}: {e}")
+                break
+            except Exception:
+                logger.exception(f"Summary catch-up of {chat_id} failed")
+                break
+            summary = result.get("response", "").strip()
+            if not summary:
+                break
+            view = chat_memory.advance(chat_id, view, summary, len(lines), anchor)
+
+def fit_prompt(request: AskRequest, view: MemoryView, budget: int = None) -> tuple:
+    """
+    Builds the prompt with as many recent messages as fit the token budget
+    (the mode's, unless given), newest first. Returns the prompt and its
+    budget metadata.
+    """
+    budget = budget or PROMPT_BUDGETS[request_mode(request)]
+    estimate = token_estimator.estimate
+    # Everything except the verbatim messages: template, question and summary
+    fixed = estimate(build_prompt(request, render_history(view.summary, [""])))
+    kept, dropped = pack_history(view.lines, max(budget - fixed, 0), estimate)
+    prompt = build_prompt(request, render_history(view.summary, kept) if kept or view.summary else "")
+    return prompt, {
+        "prompt_budget": budget,
+        "prompt_tokens_estimated": estimate(prompt),
+        "history_messages": len(kept),
+        "history_messages_dropped": dropped,
+        "summarized": bool(view.summary),
+        "retrieved_messages": len(view.pending) if view.retrieved else 0,
+    }
 
-    payload = { 
-        "model": "llama3:instruct", 
-        "prompt": prompt, 
-        "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "top_p": 0.9
-        }
+def rejection(e: SchedulerRejected) -> HTTPException:
+    return HTTPException(status_code=e.status, detail=e.message,
+                         headers={"Retry-After": str(e.retry_after)})
+
+def sse_event(data: dict, event: str = None) -> str:
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+def request_deadline(request: AskRequest, http_request: Request) -> float:
+    """
+    Monotonic deadline for the request: the caller's X-Deadline-Ms header
+    or `deadline_ms` field, capped at the mode's own timeout.
+    """
+    timeout = REQUEST_TIMEOUTS[request_mode(request)]
+    caller = http_request.headers.get("x-deadline-ms") or request.deadline_ms
+    try:
+        if caller:
+            timeout = min(timeout, float(caller) / 1000)
+    except ValueError:
+        pass
+    return time.monotonic() + timeout
+
+def complete(final: dict) -> bool:
+    """False if the answer was cut off by its token limit, so it is not worth caching."""
+    return final.get("done_reason") != "length"
+
+async def until_disconnected(http_request: Request, work: asyncio.Task):
+    # Also stops when `work` is done: is_disconnected() polls inside an
+    # anyio cancel scope, which can swallow this task's own cancellation.
+    while not work.done():
+        if await http_request.is_disconnected():
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+async def within_deadline(http_request: Request, work, timeout: float):
+    """
+    Awaits `work`, cancelling it if the client disconnects or `timeout`
+    passes first. Cancelling unsubscribes from the shared generation, which
+    aborts it upstream once nobody else is waiting for it. Raises
+    ClientDisconnected or asyncio.TimeoutError.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(until_disconnected(http_request, task))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            return task.result()
+        raise ClientDisconnected() if watcher in done else asyncio.TimeoutError()
+    finally:
+        task.cancel()
+        watcher.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+
+async def until_deadline(frames, deadline: float):
+    """
+    Yields from `frames` until the monotonic `deadline`, then closes the
+    iterator and raises asyncio.TimeoutError.
+    """
+    iterator = frames.__aiter__()
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(anext(iterator), deadline - time.monotonic())
+            except StopAsyncIteration:
+                return
+            yield frame
+    finally:
+        await iterator.aclose()
+
+def needs_map_reduce(request: AskRequest) -> bool:
+    """True for an analysis whose full history would not fit the analysis budget."""
+    if not request.analysis_mode:
+        return False
+    estimate = token_estimator.estimate
+    fixed = estimate(build_prompt(request, ""))
+    return estimate(request.history) > PROMPT_BUDGETS["analysis"] - fixed
+
+def generation(key: str, request: AskRequest, vector, deadline: float, batch: bool = False):
+    """
+    Frames of the shared upstream generation for this request. The first
+    frame is `{"meta": ...}` with the prompt budget and queue wait; Ollama
+    frames follow. The whole generation, including any summary update,
+    runs inside one scheduler slot, except map-reduce analyses, whose map
+    and reduce calls each take their own.
+
+    The history budget, `num_predict` and `num_ctx` are planned from the
+    time left before `deadline` once the slot is held, so time spent
+    queueing shortens the answer rather than overrunning the deadline.
+    The model is picked by the router. Batch items run in the scheduler's
+    batch lane; they were admitted with their batch and are never rejected.
+    """
+    async def upstream():
+        if needs_map_reduce(request):
+            lines = [line for line in request.history.splitlines() if line.strip()]
+            async for frame in analyzer.analyze(lines, scope=request.chat_id or ""):
+                if frame.get("done"):
+                    metrics.observe_generation(ANALYSIS, frame)
+                yield frame
+            return
+
+        route = router.route(request_mode(request), request.history, request.question)
+        lane = BATCH if batch else request_lane(request)
+        async with scheduler.slot(lane, admitted=batch) as waited:
+            view = await remembered_history(request, vector)
+            seconds = deadline - time.monotonic()
+            plan = functools.partial(plan_generation, request, view, deadline)
+            prompt, meta, limits = plan(route.model)
+            meta.update(limits, route=route.name, route_reason=route.reason,
+                        queue_wait_ms=round(waited * 1000, 1), deadline_ms=round(seconds * 1000))
+            yield {"meta": meta}
+            async for frame in routed_stream(route, prompt, limits, plan):
+                if frame.get("done"):
+                    planner.observe(frame.get("backend"), frame)
+                    metrics.observe_generation(request_mode(request), frame)
+                yield frame
+
+    return inflight.stream(key, upstream)
+
+def plan_generation(request: AskRequest, view: MemoryView, deadline: float, model: str) -> tuple:
+    """
+    The prompt, its budget metadata and the generation limits for `model`,
+    from its measured speeds and the time left before `deadline`.
+    """
+    budget = planner.prompt_budget(deadline - time.monotonic(), PROMPT_BUDGETS[request_mode(request)], model)
+    prompt, meta = fit_prompt(request, view, budget)
+    limits = planner.limits(deadline - time.monotonic(), meta["prompt_tokens_estimated"], model)
+    return prompt, meta, limits
+
+async def routed_stream(route: Route, prompt: str, limits: dict, plan):
+    """
+    Frames of the generation on the routed model. A small-model generation
+    that fails, or ends without producing any text, is retried on the large
+    model; nothing has been passed on by then, so callers only see the
+    answer that was kept. The retry gets a prompt and limits from
+    `plan(model)`, sized for the large model's speeds and the time left
+    after the small attempt. A 404 means the small model is not installed,
+    and turns routing off.
+    """
+    started = time.perf_counter()
+    if route.name == SMALL:
+        answered = False
+        try:
+            async for frame in ollama.stream(build_payload(prompt, True, limits, route.model)):
+                answered = answered or bool(frame.get("response"))
+                if frame.get("done"):
+                    if not answered:
+                        break
+                    observe_route(route, started, prompt, frame)
+                yield frame
+            if answered:
+                return
+            route = router.escalate(route, "empty")
+        except httpx.HTTPError as e:
+            if answered:
+                raise
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+                logger.warning(f"{route.model} is not installed; routing everything to {MODEL}")
+                router.model_missing()
+                route = router.escalate(route, "missing")
+            else:
+                route = router.escalate(route, "error")
+        prompt, _, limits = plan(route.model)
+        started = time.perf_counter()
+
+    async for frame in ollama.stream(build_payload(prompt, True, limits, route.model)):
+        if frame.get("done"):
+            observe_route(route, started, prompt, frame)
+        yield frame
+
+def observe_route(route: Route, started: float, prompt: str, frame: dict):
+    token_estimator.observe(prompt, frame.get("prompt_eval_count"))
+    elapsed = time.perf_counter() - started
+    router.observe(route, elapsed)
+    metrics.ROUTE_LATENCY.labels(route.name).observe(elapsed)
+
+@app.post("/ask")
+async def ask_ai(request: AskRequest, http_request: Request):
+    mode = request_mode(request)
+    with metrics.REQUEST_LATENCY.labels(mode).time():
+        try:
+            deadline = request_deadline(request, http_request)
+            result = await within_deadline(http_request, answer(request, mode, deadline),
+                                           deadline - time.monotonic())
+        except SchedulerRejected as e:
+            metrics.ERRORS.labels(mode, f"rejected_{e.status}").inc()
+            raise rejection(e)
+        except ClientDisconnected:
+            metrics.ERRORS.labels(mode, "disconnected").inc()
+            # Nobody is listening; 499 is what the access log should show
+            return Response(status_code=499)
+        except asyncio.TimeoutError:
+            metrics.ERRORS.labels(mode, "deadline").inc()
+            return {"answer": "I'm taking too long to respond. Please try again in a moment."}
+        except httpx.TimeoutException:
+            metrics.ERRORS.labels(mode, "timeout").inc()
+            return {"answer": "I'm taking too long to respond. Please try again in a moment."}
+        except httpx.HTTPError:
+            metrics.ERRORS.labels(mode, "connection").inc()
+            return {"answer": "I'm having trouble connecting right now. Please try again later."}
+        except ValueError:
+            metrics.ERRORS.labels(mode, "invalid_response").inc()
+            return {"answer": "There was an error processing your request. Please try again."}
+    result["answer"] = result["answer"] or "Sorry, I could not generate a response."
+    return result
+
+@app.post("/analyze")
+async def analyze_chat(request: AnalyzeRequest, http_request: Request):
+    """
+    Answers a question about a chat history. Returns `{"response", "cached",
+    "meta"}`, or `{"error"}` with status 400 (missing fields), 429/503
+    (model busy), 504 (too slow) or 500.
+    """
+    if not request.chat_data or not request.user_prompt:
+        return JSONResponse({"error": "Missing chat_data or user_prompt"}, status_code=400)
+
+    mode = request_mode(request)
+    with metrics.REQUEST_LATENCY.labels(mode).time():
+        try:
+            deadline = request_deadline(request, http_request)
+            result = await within_deadline(http_request, answer(request, mode, deadline),
+                                           deadline - time.monotonic())
+        except SchedulerRejected as e:
+            metrics.ERRORS.labels(mode, f"rejected_{e.status}").inc()
+            return JSONResponse({"error": e.message}, status_code=e.status,
+                                headers={"Retry-After": str(e.retry_after)})
+        except ClientDisconnected:
+            metrics.ERRORS.labels(mode, "disconnected").inc()
+            return Response(status_code=499)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            metrics.ERRORS.labels(mode, "timeout").inc()
+            return JSONResponse({"error": "The model took too long to respond. Please try again."},
+                                status_code=504)
+        except httpx.HTTPError as e:
+            metrics.ERRORS.labels(mode, "connection").inc()
+            urls = ", ".join(backend.url for backend in backends.backends)
+            logger.error(f"Failed to reach Llama3 at {urls}: {e}")
+            return JSONResponse({"error": f"Failed to connect to Llama3 model at {urls}. "
+                                          "Ensure the model is running and the URL is correct."},
+                                status_code=500)
+        except ValueError as e:
+            metrics.ERRORS.labels(mode, "invalid_response").inc()
+            logger.exception(f"Invalid response from the model: {e}")
+            return JSONResponse({"error": "An unexpected error occurred while processing the request."},
+                                status_code=500)
+    return {"response": result.pop("answer").strip(), **result}
+
+async def answer(request: AskRequest, mode: str, deadline: float, batch: bool = False) -> dict:
+    """
+    The answer to `request`, from a cache or a (shared) generation, as
+    `{"answer", "cached", ...}`. Scheduler, transport and response errors
+    are left to the route, which knows its own error contract.
+    """
+    key = cache_key(request)
+
+    if not request.no_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return {"answer": cached, "cached": True}
+    vector, similar = await semantic_lookup(request)
+    if similar is not None:
+        return {"answer": similar[0], "cached": True, "similarity": round(similar[1], 4)}
+
+    started = time.perf_counter()
+    if key not in inflight and not batch:
+        scheduler.check(request_lane(request))
+    accumulator = ResponseAccumulator()
+    meta = {}
+    async for frame in generation(key, request, vector, deadline, batch):
+        if "meta" in frame:
+            meta = frame["meta"]
+            continue
+        if frame.get("response") and not accumulator.text:
+            metrics.TIME_TO_FIRST_TOKEN.labels(mode).observe(time.perf_counter() - started)
+        accumulator.add(frame)
+    result = accumulator.result()
+    if result.get("response") and complete(result):
+        remember_answer(request, key, vector, result["response"])
+
+    meta = {
+        **meta,
+        "model": result.get("model"),
+        "prompt_tokens": result.get("prompt_eval_count"),
+        "completion_tokens": result.get("eval_count"),
     }
+    return {"answer": result.get("response", ""), "cached": False, "meta": meta}
+
+@app.post("/ask/stream")
+async def ask_ai_stream(request: AskRequest, http_request: Request):
+    """
+    Same prompt as /ask, but forwards tokens as Server-Sent Events while
+    Ollama generates them. Each token is a `data: {"token": ...}` frame; the
+    last frame is `event: done` carrying the Ollama timings, the measured
+    time to first token and the same `meta` block /ask returns. Failures
+    are reported as an `event: error` frame. A cache hit is sent as a
+    single token frame followed by `done`.
+
+    If the client disconnects the stream is closed, and a generation that
+    runs past the mode's deadline is ended with an error frame; either way
+    the upstream generation is aborted unless another request shares it.
+    """
+    mode = request_mode(request)
+    key = cache_key(request)
+    cached = None if request.no_cache else response_cache.get(key)
+    vector = similarity = None
+    if cached is None:
+        vector, similar = await semantic_lookup(request)
+        if similar is not None:
+            cached, similarity = similar
+    if cached is None and key not in inflight:
+        try:
+            scheduler.check(request_lane(request))
+        except SchedulerRejected as e:
+            metrics.ERRORS.labels(mode, f"rejected_{e.status}").inc()
+            raise rejection(e)
+
+    started = time.perf_counter()
+    deadline = request_deadline(request, http_request)
+
+    async def events():
+        try:
+            async for event in stream_events():
+                yield event
+        finally:
+            metrics.REQUEST_LATENCY.labels(mode).observe(time.perf_counter() - started)
 
+    async def stream_events():
+        if cached is not None:
+            yield sse_event({"token": cached})
+            done = {"cached": True}
+            if similarity is not None:
+                done["similarity"] = round(similarity, 4)
+            yield sse_event(done, event="done")
+            return
+
+        first_token_at = None
+        parts = []
+        meta = {}
+        try:
+            async for frame in until_deadline(generation(key, request, vector, deadline), deadline):
+                if "meta" in frame:
+                    meta = frame["meta"]
+                    continue
+                token = frame.get("response", "")
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.TIME_TO_FIRST_TOKEN.labels(mode).observe(first_token_at - started)
+                    parts.append(token)
+                    yield sse_event({"token": token})
+                if frame.get("done"):
+                    now = time.perf_counter()
+                    if parts and complete(frame):
+                        remember_answer(request, key, vector, "".join(parts))
+                    yield sse_event({
+                        "cached": False,
+                        "time_to_first_token_ms": round(((first_token_at or now) - started) * 1000, 1),
+                        "elapsed_ms": round((now - started) * 1000, 1),
+                        "total_duration": frame.get("total_duration"),
+                        "load_duration": frame.get("load_duration"),
+                        "prompt_eval_count": frame.get("prompt_eval_count"),
+                        "prompt_eval_duration": frame.get("prompt_eval_duration"),
+                        "eval_count": frame.get("eval_count"),
+                        "eval_duration": frame.get("eval_duration"),
+                        "meta": {
+                            **meta,
+                            "model": frame.get("model"),
+                            "prompt_tokens": frame.get("prompt_eval_count"),
+                            "completion_tokens": frame.get("eval_count"),
+                        },
+                    }, event="done")
+                    return
+        except SchedulerRejected as e:
+            metrics.ERRORS.labels(mode, f"rejected_{e.status}").inc()
+            yield sse_event({"error": e.message, "status": e.status}, event="error")
+        except asyncio.TimeoutError:
+            metrics.ERRORS.labels(mode, "deadline").inc()
+            yield sse_event({"error": "I'm taking too long to respond. Please try again in a moment."}, event="error")
+        except httpx.TimeoutException:
+            metrics.ERRORS.labels(mode, "timeout").inc()
+            yield sse_event({"error": "I'm taking too long to respond. Please try again in a moment."}, event="error")
+        except httpx.HTTPError:
+            metrics.ERRORS.labels(mode, "connection").inc()
+            yield sse_event({"error": "I'm having trouble connecting right now. Please try again later."}, event="error")
+        except ValueError:
+            metrics.ERRORS.labels(mode, "invalid_response").inc()
+            yield sse_event({"error": "There was an error processing your request. Please try again."}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/ask/batch")
+async def ask_batch(batch: BatchRequest):
+    """
+    Answers many /ask items in one call. Identical items (same cache key)
+    are answered once; BATCH_CONCURRENCY of the rest generate at a time in
+    the scheduler's batch lane, behind interactive and analysis traffic.
+    A batch arriving while the batch lane's queue is full gets a 429 before
+    anything streams; an admitted batch holds at most BATCH_CONCURRENCY
+    waiters in that queue, and each item fails with a 504 after its
+    deadline or BATCH_ITEM_TIMEOUT, queueing included.
+    Results stream back as NDJSON in completion order, one line per item:
+    `{"index", "answer", "cached", ...}`, or `{"index", "error", "status"}`
+    for an item that failed. A final `{"done": true, ...}` line carries the
+    totals.
+    """
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="The batch has no items.")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {BATCH_MAX_ITEMS} items.")
+    # Items run admitted, so the batch as a whole is admitted here: while the
+    # batch lane's queue is full, new batches are turned away with a 429
     try:
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        json_objects = [json.loads(line) for line in response.text.strip().split('\n') if line]
-        ai_answer = json_objects[-1].get("response", "Sorry, I could not generate a response.")
-
-        return {"answer": ai_answer}
-
-    except requests.exceptions.Timeout:
-        return {"answer": "I'm taking too long to respond. Please try again in a moment."}
-    except requests.exceptions.RequestException as e:
-        return {"answer": "I'm having trouble connecting right now. Please try again later."}
-    except (json.JSONDecodeError, IndexError) as e:
-        return {"answer": "There was an error processing your request. Please try again."}
\ No newline at end of file
+        scheduler.check(BATCH)
+    except SchedulerRejected as e:
+        metrics.ERRORS.labels("batch", f"rejected_{e.status}").inc()
+        raise rejection(e)
+
+    groups = {}
+    for index, item in enumerate(batch.items):
+        groups.setdefault(cache_key(item), []).append(index)
+    limiter = asyncio.Semaphore(BATCH_CONCURRENCY)
+    finished = asyncio.Queue()
+    started = time.perf_counter()
+
+    async def run(indexes: list):
+        item = batch.items[indexes[0]]
+        mode = request_mode(item)
+        async with limiter:
+            timeout = item.deadline_ms / 1000 if item.deadline_ms else BATCH_ITEM_TIMEOUT
+            try:
+                result = await asyncio.wait_for(answer(item, mode, time.monotonic() + timeout, batch=True), timeout)
+                result["answer"] = result["answer"] or "Sorry, I could not generate a response."
+            except SchedulerRejected as e:
+                metrics.ERRORS.labels(mode, f"rejected_{e.status}").inc()
+                result = {"error": e.message, "status": e.status}
+            except asyncio.TimeoutError:
+                metrics.ERRORS.labels(mode, "deadline").inc()
+                result = {"error": "The model took too long to respond.", "status": 504}
+            except httpx.TimeoutException:
+                metrics.ERRORS.labels(mode, "timeout").inc()
+                result = {"error": "The model took too long to respond.", "status": 504}
+            except httpx.HTTPError:
+                metrics.ERRORS.labels(mode, "connection").inc()
+                result = {"error": "Could not reach the model.", "status": 502}
+            except ValueError:
+                metrics.ERRORS.labels(mode, "invalid_response").inc()
+                result = {"error": "The model returned an invalid response.", "status": 502}
+            except Exception:
+                # Every item must report, or the stream would wait for it forever
+                logger.exception(f"Batch item {indexes[0]} failed")
+                metrics.ERRORS.labels(mode, "internal").inc()
+                result = {"error": "An unexpected error occurred while processing the item.", "status": 500}
+        await finished.put((indexes, result))
+
+    async def lines():
+        tasks = [asyncio.create_task(run(indexes)) for indexes in groups.values()]
+        failed = 0
+        try:
+            for _ in tasks:
+                indexes, result = await finished.get()
+                if "error" in result:
+                    failed += len(indexes)
+                for index in indexes:
+                    yield json.dumps({"index": index, **result}) + "\n"
+            elapsed = time.perf_counter() - started
+            metrics.REQUEST_LATENCY.labels("batch").observe(elapsed)
+            yield json.dumps({
+                "done": True,
+                "items": len(batch.items),
+                "unique": len(groups),
+                "failed": failed,
+                "elapsed_ms": round(elapsed * 1000, 1),
+            }) + "\n"
+        finally:
+            # Stops whatever is still queued or running if the client went away
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/backends/stats")
+async def backend_stats():
+    return backends.stats()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return {**scheduler.stats(), "speeds": planner.stats()}
+
+@app.get("/router/stats")
+async def router_stats():
+    return router.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        **response_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "coalescing": inflight.stats(),
+        "memory": chat_memory.stats(),
+        "retrieval": message_index.stats(),
+    }
+
+@app.post("/messages/index")
+async def index_messages(request: IndexRequest):
+    """
+    Adds posted messages to the chat's retrieval index. Messages already
+    indexed (by id) are skipped, so callers may resend freely.
+    """
+    if not message_index.enabled:
+        return {"indexed": 0, "enabled": False}
+    messages = [(message.id, normalize_text(message.text)) for message in request.messages]
+    try:
+        indexed = await message_index.index(request.chat_id, messages)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Embedding model unavailable.")
+    return {"indexed": indexed, "enabled": True, "size": message_index.size(request.chat_id)}
+
+@app.get("/messages/index/{chat_id}")
+async def index_status(chat_id: str):
+    """
+    How many of the chat's messages are indexed. The index lives in memory,
+    so callers check this to backfill a chat after a restart, and send a
+    longer history while the index is empty or retrieval is off.
+    """
+    return {"enabled": message_index.enabled, "size": message_index.size(chat_id)}
+
+@app.get("/ready")
+async def readiness():
+    """200 once the model has been loaded and primed, 503 until then."""
+    stats = keeper.stats()
+    return JSONResponse(stats, status_code=200 if stats["ready"] else 503)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import logging
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated Ollama base URLs, e.g. "http://gpu1:11434,http://gpu2:11434"
+OLLAMA_BASE_URLS = os.getenv("OLLAMA_BASE_URLS", "http://localhost:11434")
+# Consecutive failures before a backend is taken out of rotation
+BACKEND_EJECT_AFTER = int(os.getenv("BACKEND_EJECT_AFTER", "2"))
+BACKEND_BACKOFF_BASE = float(os.getenv("BACKEND_BACKOFF_BASE", "2"))
+BACKEND_BACKOFF_MAX = float(os.getenv("BACKEND_BACKOFF_MAX", "60"))
+BACKEND_HEALTH_INTERVAL = float(os.getenv("BACKEND_HEALTH_INTERVAL", "10"))
+BACKEND_HEALTH_TIMEOUT = float(os.getenv("BACKEND_HEALTH_TIMEOUT", "2"))
+
+
+def parse_urls(value: str) -> list:
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class Backend:
+    """One Ollama instance and its routing state."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.latency_total = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def stats(self, now: float) -> dict:
+        completed = self.requests - self.outstanding
+        return {
+            "url": self.url,
+            "available": self.available(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "ejected_for_s": round(max(self.ejected_until - now, 0), 1),
+            "avg_latency_ms": round(self.latency_total / completed * 1000, 1) if completed else None,
+        }
+
+
+class BackendPool:
+    """
+    Least-outstanding-requests routing over several Ollama instances.
+
+    A backend that fails BACKEND_EJECT_AFTER times in a row is ejected for
+    an exponentially growing backoff; a background health check probes
+    every backend (ejected ones included) and readmits those that answer.
+    If every backend is ejected, the one due back soonest is used rather
+    than failing outright.
+
+    Only the standard library is used and all state sits behind one lock,
+    so the same pool serves the asyncio AI service and the contract
+    generator's worker threads.
+    """
+
+    def __init__(self, urls=None, eject_after=BACKEND_EJECT_AFTER, backoff_base=BACKEND_BACKOFF_BASE,
+                 backoff_max=BACKEND_BACKOFF_MAX):
+        urls = parse_urls(OLLAMA_BASE_URLS) if urls is None else urls
+        if not urls:
+            raise ValueError("BackendPool needs at least one backend URL")
+        self.backends = [Backend(url) for url in urls]
+        self.eject_after = eject_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stop = threading.Event()
+
+    def acquire(self, exclude=()) -> Backend:
+        """
+        Picks the available backend with the fewest requests in flight.
+        Backends in `exclude` (those a retry has already tried) are skipped
+        unless nothing else is left.
+        """
+        now = time.monotonic()
+        with self._lock:
+            untried = [b for b in self.backends if b not in exclude] or self.backends
+            candidates = [b for b in untried if b.available(now)]
+            if candidates:
+                fewest = min(b.outstanding for b in candidates)
+                backend = random.choice([b for b in candidates if b.outstanding == fewest])
+            else:
+                backend = min(untried, key=lambda b: b.ejected_until)
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, ok: bool, elapsed: float = 0.0):
+        with self._lock:
+            backend.outstanding -= 1
+            backend.latency_total += elapsed
+            if ok:
+                backend.consecutive_failures = 0
+            else:
+                backend.failures += 1
+                self._record_failure(backend)
+
+    @contextmanager
+    def request(self):
+        """Routes one request; any exception counts as a backend failure."""
+        backend = self.acquire()
+        started = time.monotonic()
+        try:
+            yield backend
+        except BaseException:
+            self.release(backend, ok=False, elapsed=time.monotonic() - started)
+            raise
+        self.release(backend, ok=True, elapsed=time.monotonic() - started)
+
+    def _record_failure(self, backend: Backend):
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.eject_after:
+            backoff = min(self.backoff_base * (2 ** backend.ejections), self.backoff_max)
+            backend.ejected_until = time.monotonic() + backoff
+            backend.ejections += 1
+            backend.consecutive_failures = 0
+            logger.warning(f"Ejecting Ollama backend {backend.url} for {backoff:.0f}s")
+
+    def mark_healthy(self, backend: Backend):
+        with self._lock:
+            if backend.ejected_until:
+                logger.info(f"Ollama backend {backend.url} is healthy again")
+            backend.ejected_until = 0.0
+            backend.ejections = 0
+            backend.consecutive_failures = 0
+
+    def mark_unhealthy(self, backend: Backend):
+        with self._lock:
+            if backend.available(time.monotonic()):
+                backend.consecutive_failures = self.eject_after - 1
+                self._record_failure(backend)
+
+    def check(self, backend: Backend, timeout: float = BACKEND_HEALTH_TIMEOUT) -> bool:
+        try:
+            with urllib.request.urlopen(f"{backend.url}/api/tags", timeout=timeout) as response:
+                healthy = response.status == 200
+        except Exception:
+            healthy = False
+        if healthy:
+            self.mark_healthy(backend)
+        else:
+            self.mark_unhealthy(backend)
+        return healthy
+
+    def start_health_checks(self, interval: float = BACKEND_HEALTH_INTERVAL):
+        """Probes every backend from a daemon thread every `interval` seconds."""
+        if self._health_thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                for backend in self.backends:
+                    self.check(backend)
+
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=run, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+        self._health_thread = None
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [backend.stats(now) for backend in self.backends]
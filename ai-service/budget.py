@@ -0,0 +1,156 @@
+import os
+import math
+import threading
+
+# Context window requested from Ollama (its own default is only 2048)
+LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "8192"))
+
+# Prompt tokens allowed per mode; the rest of the context is left for the answer
+PROMPT_BUDGETS = {
+    "ask": int(os.getenv("PROMPT_BUDGET_ASK", "3072")),
+    "analysis": int(os.getenv("PROMPT_BUDGET_ANALYSIS", "6144")),
+    "analyze": int(os.getenv("PROMPT_BUDGET_ANALYZE", "3072")),
+}
+
+# Starting point for the chars-per-token ratio; llama3's tokenizer averages
+# roughly four characters per token on English chat text.
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4.0"))
+
+
+class TokenEstimator:
+    """
+    Character-count token estimate, calibrated against the prompt_eval_count
+    Ollama reports for prompts we actually sent. Cheap enough to run per
+    message while packing history.
+    """
+
+    # Calibration samples are ignored outside this range: prompt_eval_count
+    # undercounts when Ollama reuses a cached prompt prefix.
+    MIN_RATIO = 2.0
+    MAX_RATIO = 6.0
+
+    def __init__(self, chars_per_token=CHARS_PER_TOKEN, smoothing=0.1):
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def estimate(self, text: str) -> int:
+        return math.ceil(len(text or "") / self.chars_per_token)
+
+    def observe(self, prompt: str, prompt_eval_count):
+        """Folds one measured (prompt, token count) pair into the ratio."""
+        if not prompt_eval_count or len(prompt) < 200:
+            return
+        ratio = len(prompt) / prompt_eval_count
+        if not self.MIN_RATIO <= ratio <= self.MAX_RATIO:
+            return
+        with self._lock:
+            self.chars_per_token += self.smoothing * (ratio - self.chars_per_token)
+
+
+def pack_history(lines: list, budget: int, estimate) -> tuple:
+    """
+    Keeps the newest messages that fit in `budget` tokens. Returns the kept
+    messages in chronological order and the number dropped.
+    """
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate(line) + 1  # newline
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return kept, len(lines) - len(kept)
+
+
+# Speeds assumed for a backend until Ollama has reported real ones
+DEFAULT_DECODE_TPS = float(os.getenv("DEFAULT_DECODE_TPS", "20"))
+DEFAULT_PREFILL_TPS = float(os.getenv("DEFAULT_PREFILL_TPS", "400"))
+# Share of a deadline held back for queueing, network and model overhead
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN", "0.15"))
+# Most of the time left may go to reading the prompt; the rest is the answer's
+PROMPT_TIME_SHARE = float(os.getenv("PROMPT_TIME_SHARE", "0.35"))
+MIN_PROMPT_BUDGET = int(os.getenv("MIN_PROMPT_BUDGET", "512"))
+MIN_PREDICT = int(os.getenv("MIN_PREDICT", "48"))
+# Context sizes a plan may choose from. Ollama reloads the model whenever
+# num_ctx changes, so keep this short; by default only LLM_NUM_CTX is used.
+LLM_NUM_CTX_STEPS = sorted(int(size) for size in os.getenv("LLM_NUM_CTX_STEPS", str(LLM_NUM_CTX)).split(","))
+
+
+class GenerationPlanner:
+    """
+    Derives generation limits from the time a caller is willing to wait, so
+    an answer finishes inside the deadline instead of being cut off by it.
+    Prompt-processing and decode speeds are measured per backend and model
+    from the timings in Ollama's final frames; plans use the slowest backend
+    for the model, since a request can land on any of them.
+    """
+
+    # Prompt samples this short are mostly prompt-cache hits and say little
+    MIN_PREFILL_SAMPLE = 32
+
+    def __init__(self, decode_tps=DEFAULT_DECODE_TPS, prefill_tps=DEFAULT_PREFILL_TPS,
+                 margin=DEADLINE_MARGIN, smoothing=0.2):
+        self.default_decode_tps = decode_tps
+        self.default_prefill_tps = prefill_tps
+        self.margin = margin
+        self.smoothing = smoothing
+        self._speeds = {}
+        self._lock = threading.Lock()
+
+    def observe(self, backend: str, final: dict):
+        """Folds the speeds from one final Ollama frame into the backend's averages for its model."""
+        samples = {}
+        if final.get("eval_count") and final.get("eval_duration"):
+            samples["decode"] = final["eval_count"] / (final["eval_duration"] / 1e9)
+        if (final.get("prompt_eval_count") or 0) >= self.MIN_PREFILL_SAMPLE and final.get("prompt_eval_duration"):
+            samples["prefill"] = final["prompt_eval_count"] / (final["prompt_eval_duration"] / 1e9)
+        with self._lock:
+            speeds = self._speeds.setdefault((backend, final.get("model")), {})
+            for kind, value in samples.items():
+                current = speeds.get(kind)
+                speeds[kind] = value if current is None else current + self.smoothing * (value - current)
+
+    def speeds(self, model: str = None) -> tuple:
+        """(decode, prefill) tokens per second of the slowest measured backend for `model`."""
+        with self._lock:
+            measured = [s for (_, m), s in self._speeds.items() if model is None or m == model]
+            decode = [s["decode"] for s in measured if "decode" in s]
+            prefill = [s["prefill"] for s in measured if "prefill" in s]
+        return (min(decode, default=self.default_decode_tps),
+                min(prefill, default=self.default_prefill_tps))
+
+    def _usable(self, seconds: float) -> float:
+        return max(seconds, 0.0) * (1 - self.margin)
+
+    def prompt_budget(self, seconds: float, budget: int, model: str = None) -> int:
+        """The mode's prompt budget, shrunk if reading it would eat the deadline."""
+        _, prefill = self.speeds(model)
+        affordable = int(self._usable(seconds) * PROMPT_TIME_SHARE * prefill)
+        return min(budget, max(affordable, MIN_PROMPT_BUDGET))
+
+    def limits(self, seconds: float, prompt_tokens: int, model: str = None) -> dict:
+        """`num_predict` and `num_ctx` for a prompt that must be answered within `seconds`."""
+        decode, prefill = self.speeds(model)
+        answer_seconds = self._usable(seconds) - prompt_tokens / prefill
+        num_predict = max(int(answer_seconds * decode), MIN_PREDICT)
+        num_ctx = next((size for size in LLM_NUM_CTX_STEPS if size >= prompt_tokens + num_predict),
+                       LLM_NUM_CTX_STEPS[-1])
+        return {
+            "num_predict": min(num_predict, max(num_ctx - prompt_tokens, MIN_PREDICT)),
+            "num_ctx": num_ctx,
+        }
+
+    def stats(self) -> dict:
+        decode, prefill = self.speeds()
+        with self._lock:
+            backends = [{"backend": url, "model": model,
+                         **{f"{kind}_tps": round(value, 1) for kind, value in speeds.items()}}
+                        for (url, model), speeds in self._speeds.items()]
+        return {
+            "decode_tps": round(decode, 1),
+            "prefill_tps": round(prefill, 1),
+            "backends": backends,
+        }
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapses runs of whitespace so cosmetic differences share a key."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def normalize_history(history: str) -> str:
+    """Normalizes each line of a chat history and drops blank lines."""
+    lines = (normalize_text(line) for line in (history or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(model: str, options: dict, mode: str, history: str, question: str) -> str:
+    """
+    Hashes everything that determines the model output into a cache key.
+    The question is case-folded; the history keeps its case because it is
+    quoted back to the model verbatim.
+    """
+    material = json.dumps({
+        "model": model,
+        "options": options or {},
+        "mode": mode,
+        "history": normalize_history(history),
+        "question": normalize_text(question).lower(),
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL. Every operation takes the
+    lock, so one instance may be shared between threads.
+    """
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
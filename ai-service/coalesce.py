@@ -0,0 +1,118 @@
+import asyncio
+
+
+class _Flight:
+    """
+    One upstream generation and the frames it has produced so far. Late
+    subscribers replay the frames already received, then follow live.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._cond = asyncio.Condition()
+
+    async def publish(self, frame):
+        async with self._cond:
+            self.frames.append(frame)
+            self._cond.notify_all()
+
+    async def finish(self, error=None):
+        async with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: index < len(self.frames) or self.done)
+                batch = self.frames[index:]
+                done, error = self.done, self.error
+            index += len(batch)
+            for frame in batch:
+                yield frame
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent requests that share a key onto one upstream call.
+    The first caller starts the generation; everyone who arrives while it is
+    running receives the same frames. The flight is forgotten as soon as it
+    finishes, so later requests go through the response cache instead.
+
+    When the last subscriber leaves (client disconnected, deadline passed)
+    the upstream generation is cancelled, which closes its connection so
+    the backend stops generating and the scheduler slot is freed.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    async def stream(self, key: str, factory):
+        """
+        Yields the frames of the in-flight generation for `key`, starting one
+        with `factory()` (an async iterator) if none is running.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, factory))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.subscribers += 1
+        try:
+            async for frame in flight.subscribe():
+                yield frame
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._cancel(key, flight)
+
+    def _cancel(self, key, flight):
+        # Forget the flight now, so a request arriving while the cancellation
+        # unwinds starts a fresh generation instead of joining a dead one.
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.done():
+            flight.task.cancel()
+            self.cancelled += 1
+
+    async def _pump(self, key, flight, factory):
+        error = None
+        try:
+            async for frame in factory():
+                await flight.publish(frame)
+        except BaseException as e:
+            error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            await flight.finish(error)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,54 @@
+import os
+import asyncio
+import logging
+import threading
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    np = None
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+# Same embedding model the contract generator's RAG store uses
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+class Embedder:
+    """
+    Lazily loaded sentence-transformers model shared by the semantic cache
+    and the message index, so the service holds one copy of the weights.
+    Encoding is CPU-bound; the async helpers run it in a worker thread.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.available = SentenceTransformer is not None
+        if not self.available:
+            logger.warning("sentence-transformers is not installed; embedding features are disabled.")
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _encoder(self):
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.model_name)
+                logger.info(f"Embedding model '{self.model_name}' loaded.")
+            return self._model
+
+    def embed(self, text: str):
+        """Unit-length float32 embedding of `text`."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list):
+        """Unit-length float32 embeddings, one row per text."""
+        vectors = self._encoder().encode(texts, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def aembed(self, text: str):
+        return await asyncio.to_thread(self.embed, text)
+
+    async def aembed_many(self, texts: list):
+        return await asyncio.to_thread(self.embed_many, texts)
@@ -0,0 +1,122 @@
+import json
+import time
+import asyncio
+import argparse
+import threading
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# A stand-in for Ollama's /api/generate that streams canned tokens at a set
+# pace and counts what happens to each generation, for the cancellation
+# tests and the load test.
+#
+#   python fake_ollama.py --port 11434 --token-delay 0.05
+
+
+class FakeOllama:
+    """
+    Answers every prompt with `tokens` words, one every `token_delay`
+    seconds. Models in `missing` get a 404 like an unpulled model.
+    `stats` counts generations that started, completed, and were cancelled
+    because the caller closed the connection.
+    """
+
+    def __init__(self, token_delay: float = 0.05, tokens: int = 20, missing=()):
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.missing = set(missing)
+        self.calls = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.running = 0
+        self.max_running = 0
+        self.app = self._build()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "completed": self.completed, "cancelled": self.cancelled,
+                "running": self.running, "max_running": self.max_running}
+
+    def reset(self):
+        self.calls = self.completed = self.cancelled = self.running = self.max_running = 0
+
+    def _build(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [{"name": "llama3:instruct"}]}
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats()
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            body = await request.json()
+            model = body.get("model")
+            if model in self.missing:
+                return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+            self.calls += 1
+            count = min(self.tokens, body.get("options", {}).get("num_predict") or self.tokens)
+            if body.get("stream") is False:
+                text = " ".join([word async for word in self._words(count)])
+                return self._final(model, body, count) | {"response": text}
+            return StreamingResponse(self._frames(model, body, count), media_type="application/x-ndjson")
+
+        return app
+
+    async def _words(self, count: int):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            for i in range(count):
+                await asyncio.sleep(self.token_delay)
+                yield f"word{i}"
+            self.completed += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+
+    async def _frames(self, model: str, body: dict, count: int):
+        async for word in self._words(count):
+            yield json.dumps({"model": model, "response": word + " ", "done": False}) + "\n"
+        yield json.dumps(self._final(model, body, count)) + "\n"
+
+    def _final(self, model: str, body: dict, count: int) -> dict:
+        duration = int(count * self.token_delay * 1e9)
+        return {"model": model, "response": "", "done": True,
+                "prompt_eval_count": len(body.get("prompt", "")) // 4, "prompt_eval_duration": 1000,
+                "eval_count": count, "eval_duration": duration, "total_duration": duration}
+
+
+class Server:
+    """Runs an ASGI app with uvicorn in a daemon thread, for tests and scripts."""
+
+    def __init__(self, app, port: int):
+        self.url = f"http://127.0.0.1:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--missing", nargs="*", default=[], help="models to answer with a 404")
+    args = parser.parse_args()
+    fake = FakeOllama(args.token_delay, args.tokens, args.missing)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
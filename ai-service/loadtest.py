@@ -0,0 +1,77 @@
+import os
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import httpx
+from fake_ollama import FakeOllama, Server
+
+# Fires concurrent /ask requests at one in-process worker backed by a fake
+# Ollama that takes a fixed time per answer, and reports throughput and
+# latency. With a non-blocking client, throughput grows with concurrency
+# until the scheduler's LLM_MAX_CONCURRENCY; a blocking call would hold it
+# at one answer per generation time.
+#
+#   python loadtest.py --requests 200 --concurrency 1 8 32
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(url: str, requests: int, concurrency: int, tag: str) -> tuple:
+    latencies = []
+    failures = 0
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def one(client, i):
+        nonlocal failures
+        async with limiter:
+            started = time.perf_counter()
+            response = await client.post(f"{url}/ask", json={"question": f"load {tag} {i}", "no_cache": True})
+            # Errors come back as a 200 with an apology and no meta
+            if response.status_code != 200 or "meta" not in response.json():
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        return time.perf_counter() - started, latencies, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /ask against a fake Ollama")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--token-delay", type=float, default=0.02,
+                        help="seconds per fake token; an answer is --tokens of them")
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    # The service reads these at import; admit every client at once
+    fake_port = free_port()
+    os.environ["OLLAMA_BASE_URLS"] = f"http://127.0.0.1:{fake_port}"
+    os.environ["WARM_MODELS"] = ""
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(max(args.concurrency)))
+    os.environ.setdefault("LLM_QUEUE_LIMIT", str(args.requests))
+    import app
+
+    fake = FakeOllama(args.token_delay, args.tokens)
+    generation_s = args.token_delay * args.tokens
+    with Server(fake.app, fake_port), Server(app.app, free_port()) as service:
+        print(f"one answer takes {generation_s:.2f}s upstream; "
+              f"LLM_MAX_CONCURRENCY={app.scheduler.concurrency}")
+        for concurrency in args.concurrency:
+            fake.reset()
+            elapsed, latencies, failures = asyncio.run(
+                run(service.url, args.requests, concurrency, f"c{concurrency}"))
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"concurrency {concurrency:3d}: {args.requests / elapsed:6.1f} req/s | "
+                  f"p50 {statistics.median(latencies) * 1000:6.0f} ms, p95 {p95 * 1000:6.0f} ms | "
+                  f"{fake.max_running} generations at once upstream | {failures} failed")
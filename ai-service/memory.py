@@ -0,0 +1,193 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+# Messages kept verbatim at the end of every prompt
+MEMORY_RECENT_WINDOW = int(os.getenv("MEMORY_RECENT_WINDOW", "20"))
+# Older messages are folded into the summary once this many have piled up
+MEMORY_SUMMARY_BATCH = int(os.getenv("MEMORY_SUMMARY_BATCH", "20"))
+MEMORY_MAX_CHATS = int(os.getenv("MEMORY_MAX_CHATS", "10000"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "256"))
+# Message tokens folded into the summary per call; a long backlog is caught
+# up over several calls of this size instead of one huge prompt
+MEMORY_SUMMARY_PROMPT_TOKENS = int(os.getenv("MEMORY_SUMMARY_PROMPT_TOKENS", "3072"))
+# Summary calls one background catch-up makes; any backlog left is picked up
+# by the catch-up a later request starts, and stays verbatim meanwhile
+MEMORY_SUMMARY_MAX_BATCHES = int(os.getenv("MEMORY_SUMMARY_MAX_BATCHES", "2"))
+
+
+def _anchor(previous: str, line: str) -> str:
+    """Fingerprint of a message together with the one before it."""
+    return hashlib.sha1(f"{previous}\n{line}".encode("utf-8")).hexdigest()
+
+
+def summary_prompt(summary: str, lines: list) -> str:
+    previous = summary or "(no earlier summary)"
+    new_messages = "\n".join(lines)
+    return f"""
+You maintain a running summary of a group chat so that an assistant can answer questions about it later.
+
+**Current summary:**
+{previous}
+
+**New messages since the summary:**
+{new_messages}
+
+Rewrite the summary so it also covers the new messages. Keep names, decisions, open questions and the overall tone. Be concise and do not exceed a few short paragraphs.
+
+**Updated summary:**
+"""
+
+
+def render_history(summary: str, lines: list) -> str:
+    verbatim = "\n".join(lines)
+    if not summary:
+        return verbatim
+    return f"[Summary of earlier messages]\n{summary}\n\n[Recent messages]\n{verbatim}"
+
+
+class MemoryView:
+    """
+    What a prompt should contain for one chat: the running summary, the
+    older messages not yet folded into it, and the recent window. With
+    `retrieved` set, `pending` holds older messages picked by relevance to
+    the question instead. `previous` is the message just before `pending`.
+    An unanchored view comes from a history that does not contain the end
+    of the summary; its older messages are shown but never summarized.
+    """
+
+    def __init__(self, summary: str, pending: list, recent: list, anchor: str, retrieved: bool = False,
+                 previous: str = "", anchored: bool = True):
+        self.summary = summary
+        self.pending = pending
+        self.recent = recent
+        self.anchor = anchor
+        self.retrieved = retrieved
+        self.previous = previous
+        self.anchored = anchored
+
+    @property
+    def needs_summary(self) -> bool:
+        return self.anchored and len(self.pending) >= MEMORY_SUMMARY_BATCH
+
+    @property
+    def lines(self) -> list:
+        """Messages that go into the prompt verbatim, oldest first."""
+        return self.pending + self.recent
+
+    def render(self) -> str:
+        return render_history(self.summary, self.lines)
+
+    def next_batch(self, estimate, budget: int = MEMORY_SUMMARY_PROMPT_TOKENS) -> tuple:
+        """
+        The oldest pending messages that fit in `budget` tokens, at least
+        one, and the anchor after the last of them. A single message over
+        the budget is cut to fit.
+        """
+        lines = []
+        used = 0
+        for line in self.pending:
+            cost = estimate(line) + 1  # newline
+            if lines and used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        previous = lines[-2] if len(lines) > 1 else self.previous
+        anchor = _anchor(previous, lines[-1])
+        if used > budget:
+            lines = [lines[0][:len(lines[0]) * budget // used]]
+        return lines, anchor
+
+
+class ChatMemory:
+    """
+    Per-chat summary of older messages plus a verbatim window of recent
+    ones. For each chat only the summary and a fingerprint of the last
+    summarized message are stored, so the work per update is proportional
+    to the messages posted since, and the prompt stays roughly the same
+    size however long the chat gets.
+
+    Callers may send different windows of the same chat (the full history,
+    only the latest messages). A window that does not contain the last
+    summarized message cannot be placed relative to the summary, so its
+    older messages go into the prompt verbatim and the memory is left
+    untouched, rather than summarizing them a second time.
+
+    Updates to one chat are serialized with a lock per chat, made by
+    `lock_factory` (asyncio locks by default).
+    """
+
+    def __init__(self, lock_factory=asyncio.Lock, max_chats=MEMORY_MAX_CHATS,
+                 recent_window=MEMORY_RECENT_WINDOW):
+        self.max_chats = max_chats
+        self.recent_window = recent_window
+        self._lock_factory = lock_factory
+        self._chats = OrderedDict()
+        # Per-chat update locks, least recently used first; bounded on their
+        # own, since most chats never get a summary
+        self._locks = OrderedDict()
+
+    def lock(self, chat_id: str):
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = self._lock_factory()
+            self._evict_locks()
+        else:
+            self._locks.move_to_end(chat_id)
+        return lock
+
+    def _evict_locks(self):
+        # A held lock is never dropped, or a second caller could create a
+        # fresh one and update the same chat at the same time
+        excess = len(self._locks) - self.max_chats
+        for chat_id in list(self._locks):
+            if excess <= 0:
+                break
+            if not self._locks[chat_id].locked():
+                del self._locks[chat_id]
+                excess -= 1
+
+    def view(self, chat_id: str, history: str) -> MemoryView:
+        lines = [line for line in (history or "").splitlines() if line.strip()]
+        split = max(len(lines) - self.recent_window, 0)
+        older, recent = lines[:split], lines[split:]
+
+        summary, anchor = self._chats.get(chat_id, ("", None))
+        start = 0
+        if anchor is not None:
+            # Find where the last summary stopped; scan from the end because
+            # new messages are appended there.
+            for i in range(len(older) - 1, -1, -1):
+                if _anchor(older[i - 1] if i else "", older[i]) == anchor:
+                    start = i + 1
+                    break
+            else:
+                if older:
+                    return MemoryView(summary, older, recent, anchor, anchored=False)
+        pending = older[start:]
+        if pending:
+            last = split - 1
+            anchor = _anchor(lines[last - 1] if last else "", lines[last])
+        return MemoryView(summary, pending, recent, anchor, previous=older[start - 1] if start else "")
+
+    def advance(self, chat_id: str, view: MemoryView, summary: str, count: int = None,
+                anchor: str = None) -> MemoryView:
+        """
+        Records that the first `count` pending messages (all of them by
+        default), ending at `anchor`, are now covered by `summary`.
+        """
+        if count is None:
+            count, anchor = len(view.pending), view.anchor
+        self._chats[chat_id] = (summary, anchor)
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        previous = view.pending[count - 1] if count else view.previous
+        return MemoryView(summary, view.pending[count:], view.recent, view.anchor, previous=previous)
+
+    def forget(self, chat_id: str):
+        self._chats.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {"chats": len(self._chats), "max_chats": self.max_chats}
@@ -0,0 +1,147 @@
+from prometheus_client import Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+REQUEST_LATENCY = Histogram(
+    "ai_request_latency_seconds", "End-to-end request latency, cache hits included.",
+    ["mode"], buckets=LATENCY_BUCKETS)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "ai_time_to_first_token_seconds", "Time from request to the first generated token.",
+    ["mode"], buckets=LATENCY_BUCKETS)
+TOKENS_PER_SECOND = Histogram(
+    "ai_generation_tokens_per_second", "Decode speed reported by Ollama (eval_count / eval_duration).",
+    ["mode"], buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150))
+PROMPT_TOKENS = Histogram(
+    "ai_prompt_tokens", "Prompt tokens per generation (prompt_eval_count).",
+    ["mode"], buckets=TOKEN_BUCKETS)
+COMPLETION_TOKENS = Histogram(
+    "ai_completion_tokens", "Completion tokens per generation (eval_count).",
+    ["mode"], buckets=TOKEN_BUCKETS)
+ROUTE_LATENCY = Histogram(
+    "ai_route_latency_seconds", "Generation time per model route, from slot to final frame.",
+    ["route"], buckets=LATENCY_BUCKETS)
+ERRORS = Counter(
+    "ai_errors_total", "Failed requests by error class.", ["mode", "kind"])
+
+
+def observe_generation(mode: str, final: dict):
+    """Records the token counts and decode speed from Ollama's final frame."""
+    prompt_tokens = final.get("prompt_eval_count")
+    completion_tokens = final.get("eval_count")
+    eval_duration = final.get("eval_duration")
+    if prompt_tokens is not None:
+        PROMPT_TOKENS.labels(mode).observe(prompt_tokens)
+    if completion_tokens is not None:
+        COMPLETION_TOKENS.labels(mode).observe(completion_tokens)
+        if eval_duration:
+            TOKENS_PER_SECOND.labels(mode).observe(completion_tokens / (eval_duration / 1e9))
+
+
+class StatsCollector:
+    """
+    Exposes the counters the caches, message index, scheduler, router and
+    backend pool already keep, read at scrape time, so those modules need no
+    Prometheus code of their own. Any of them may be None for a service that
+    does not use it.
+    """
+
+    def __init__(self, cache=None, semantic_cache=None, message_index=None, scheduler=None, backends=None,
+                 router=None):
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.message_index = message_index
+        self.router = router
+        self.scheduler = scheduler
+        self.backends = backends
+
+    def collect(self):
+        if self.cache is not None:
+            stats = self.cache.stats()
+            lookups = CounterMetricFamily("ai_cache_lookups", "Response cache lookups.", labels=["result"])
+            lookups.add_metric(["hit"], stats["hits"])
+            lookups.add_metric(["miss"], stats["misses"])
+            yield lookups
+            yield GaugeMetricFamily("ai_cache_hit_ratio", "Response cache hit ratio since start.",
+                                    value=stats["hit_ratio"])
+            yield GaugeMetricFamily("ai_cache_entries", "Entries in the response cache.", value=stats["size"])
+
+        if self.semantic_cache is not None and self.semantic_cache.enabled:
+            stats = self.semantic_cache.stats()
+            lookups = CounterMetricFamily("ai_semantic_cache_lookups", "Semantic cache lookups.",
+                                          labels=["result"])
+            lookups.add_metric(["hit"], stats["hits"])
+            lookups.add_metric(["miss"], stats["misses"])
+            yield lookups
+            yield GaugeMetricFamily("ai_semantic_cache_hit_ratio", "Semantic cache hit ratio since start.",
+                                    value=stats["hit_ratio"])
+            yield CounterMetricFamily("ai_semantic_cache_evictions", "History scopes evicted.",
+                                      value=stats["evictions"])
+            yield GaugeMetricFamily("ai_semantic_cache_scopes", "History scopes held.", value=stats["scopes"])
+
+        if self.message_index is not None and self.message_index.enabled:
+            stats = self.message_index.stats()
+            yield GaugeMetricFamily("ai_retrieval_chats", "Chats in the message index.", value=stats["chats"])
+            yield GaugeMetricFamily("ai_retrieval_messages", "Messages in the message index.",
+                                    value=stats["messages"])
+            yield CounterMetricFamily("ai_retrieval_searches", "Message index searches.", value=stats["searches"])
+
+        if self.scheduler is not None:
+            stats = self.scheduler.stats()
+            queued = GaugeMetricFamily("ai_queue_depth", "Requests waiting for a backend slot.", labels=["lane"])
+            running = GaugeMetricFamily("ai_running_generations", "Generations holding a backend slot.",
+                                        labels=["lane"])
+            rejected = CounterMetricFamily("ai_queue_rejected", "Requests rejected by admission control.",
+                                           labels=["lane", "reason"])
+            for lane, lane_stats in stats["lanes"].items():
+                queued.add_metric([lane], lane_stats["queued"])
+                running.add_metric([lane], lane_stats["running"])
+                rejected.add_metric([lane, "queue_full"], lane_stats["rejected"])
+                rejected.add_metric([lane, "queue_timeout"], lane_stats["timed_out"])
+            yield queued
+            yield running
+            yield rejected
+
+        if self.router is not None:
+            stats = self.router.stats()
+            routed = CounterMetricFamily("ai_route_requests", "Requests per model route and reason.",
+                                         labels=["route", "reason"])
+            for route, route_stats in stats["routes"].items():
+                for reason, count in route_stats["reasons"].items():
+                    routed.add_metric([route, reason], count)
+            yield routed
+            escalations = CounterMetricFamily("ai_route_escalations", "Small-model requests escalated.",
+                                              labels=["reason"])
+            for reason, count in stats["escalations"].items():
+                escalations.add_metric([reason], count)
+            yield escalations
+
+        if self.backends is not None:
+            outstanding = GaugeMetricFamily("ai_backend_outstanding", "Requests in flight per backend.",
+                                            labels=["backend"])
+            available = GaugeMetricFamily("ai_backend_available", "1 if the backend is in rotation.",
+                                          labels=["backend"])
+            requests = CounterMetricFamily("ai_backend_requests", "Requests routed per backend.",
+                                           labels=["backend"])
+            failures = CounterMetricFamily("ai_backend_failures", "Failed requests per backend.",
+                                           labels=["backend"])
+            for backend in self.backends.stats():
+                url = backend["url"]
+                outstanding.add_metric([url], backend["outstanding"])
+                available.add_metric([url], 1 if backend["available"] else 0)
+                requests.add_metric([url], backend["requests"])
+                failures.add_metric([url], backend["failures"])
+            yield outstanding
+            yield available
+            yield requests
+            yield failures
+
+
+def register_stats(**sources):
+    REGISTRY.register(StatsCollector(**sources))
+
+
+def render() -> tuple:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,169 @@
+# File: ai-service/ollama_client.py
+import os
+import json
+import time
+import httpx
+
+from backend_pool import BackendPool
+from warmup import keep_alive_value
+
+GENERATE_PATH = "/api/generate"
+
+# Connection pool settings. One pooled client is shared by every request in
+# the worker, so keep-alive connections are reused instead of reopened.
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "64"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "30"))
+
+
+class NDJSONParser:
+    """
+    Incremental newline-delimited JSON parser. Bytes are fed in as they come
+    off the socket; only the unterminated tail of the last line is buffered.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> list:
+        """Adds a chunk and returns the objects whose lines it completed."""
+        self._buffer += chunk
+        objects = []
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line = self._buffer[start:end]
+            start = end + 1
+            if line.strip():
+                objects.append(json.loads(line))
+        del self._buffer[:start]
+        return objects
+
+    def close(self) -> list:
+        """Flushes a final line that was not newline-terminated."""
+        line, self._buffer = self._buffer, bytearray()
+        return [json.loads(line)] if line.strip() else []
+
+
+class ResponseAccumulator:
+    """
+    Builds the answer from Ollama generate objects as they arrive, keeping
+    only the running text and the final (`done: true`) stats object.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self.final = None
+
+    def add(self, obj: dict):
+        token = obj.get("response")
+        if token:
+            self._parts.append(token)
+        if obj.get("done"):
+            self.final = obj
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def result(self) -> dict:
+        if self.final is None:
+            raise ValueError("Ollama response ended without a final object")
+        return {**self.final, "response": self.text}
+
+
+class OllamaClient:
+    """
+    Async, connection-pooled client for the Ollama generate API.
+    Requests await on the socket instead of blocking the event loop, so one
+    worker can keep many generations in flight at once. Each request is
+    routed to a backend from `backends`, and carries OLLAMA_KEEP_ALIVE unless
+    the payload sets its own, so the model is not unloaded between requests.
+    """
+
+    def __init__(self, backends: BackendPool = None, pool_size=OLLAMA_POOL_SIZE,
+                 timeout=OLLAMA_TIMEOUT, connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+                 keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY, keep_alive=None):
+        self.backends = backends or BackendPool()
+        self.keep_alive = keep_alive if keep_alive is not None else keep_alive_value()
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return httpx.USE_CLIENT_DEFAULT
+        return httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+    async def generate(self, payload: dict, timeout: float = None) -> dict:
+        """
+        Sends a generate request and returns the final Ollama response object.
+        `timeout` overrides the client default for this request only.
+        """
+        accumulator = ResponseAccumulator()
+        async for obj in self.stream(payload, timeout=timeout, force_stream=False):
+            accumulator.add(obj)
+        return accumulator.result()
+
+    async def stream(self, payload: dict, timeout: float = None, force_stream: bool = True):
+        """
+        Sends a generate request and yields each Ollama NDJSON object as soon
+        as its line arrives. The last object has `done: true` and is tagged
+        with the URL of the backend that served it.
+
+        A backend that refuses the connection is reported to the pool and the
+        request moves on to one it has not tried yet; nothing has been
+        yielded yet, so the retry is invisible to the caller.
+        """
+        payload = {"keep_alive": self.keep_alive, **payload}
+        if force_stream:
+            payload["stream"] = True
+        attempts = len(self.backends.backends)
+        tried = []
+        for attempt in range(attempts):
+            backend = self.backends.acquire(exclude=tried)
+            tried.append(backend)
+            started = time.monotonic()
+            failed = False
+            try:
+                parser = NDJSONParser()
+                async with self._client.stream("POST", backend.url + GENERATE_PATH, json=payload,
+                                               timeout=self._timeout(timeout)) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        for obj in parser.feed(chunk):
+                            yield self._tagged(obj, backend)
+                    for obj in parser.close():
+                        yield self._tagged(obj, backend)
+                return
+            except httpx.ConnectError:
+                failed = True
+                if attempt + 1 == attempts:
+                    raise
+            except httpx.HTTPStatusError as e:
+                failed = e.response.status_code >= 500
+                raise
+            except httpx.TransportError:
+                failed = True
+                raise
+            finally:
+                self.backends.release(backend, ok=not failed, elapsed=time.monotonic() - started)
+
+    @staticmethod
+    def _tagged(obj: dict, backend) -> dict:
+        if obj.get("done"):
+            obj["backend"] = backend.url
+        return obj
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict
+
+from embeddings import Embedder, np
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") not in ("0", "false", "False")
+# Older messages pulled into the prompt by relevance to the question
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+RETRIEVAL_MAX_MESSAGES = int(os.getenv("RETRIEVAL_MAX_MESSAGES", "20000"))
+RETRIEVAL_MAX_CHATS = int(os.getenv("RETRIEVAL_MAX_CHATS", "1000"))
+
+
+class _ChatIndex:
+    """Embedded messages of one chat, in the order they were posted."""
+
+    def __init__(self, dimensions: int):
+        self.ids = []
+        self.texts = []
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.known = set()
+
+
+class MessageIndex:
+    """
+    Per-chat embedding index of chat messages. Messages are added as they
+    are posted (only ids not seen before are embedded), and at question time
+    the index returns the top-k messages most similar to the question, in
+    chat order, so the prompt carries what is relevant instead of whatever
+    happened to be among the last N messages.
+
+    Each chat keeps its newest RETRIEVAL_MAX_MESSAGES messages and chats are
+    evicted least recently used. Disabled when sentence-transformers is not
+    installed.
+    """
+
+    def __init__(self, embedder: Embedder, top_k=RETRIEVAL_TOP_K, min_score=RETRIEVAL_MIN_SCORE,
+                 max_messages=RETRIEVAL_MAX_MESSAGES, max_chats=RETRIEVAL_MAX_CHATS,
+                 enabled=RETRIEVAL_ENABLED):
+        self.embedder = embedder
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.enabled = enabled and embedder.available
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def unseen(self, chat_id: str, messages: list) -> list:
+        """The (id, text) pairs not yet in the chat's index."""
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            known = entry.known if entry is not None else set()
+            fresh, batch = [], set()
+            for message_id, text in messages:
+                if message_id not in known and message_id not in batch and text.strip():
+                    fresh.append((message_id, text))
+                    batch.add(message_id)
+            return fresh
+
+    def add(self, chat_id: str, messages: list, vectors) -> int:
+        """
+        Appends already-embedded (id, text) pairs to the chat's index and
+        returns how many were new. Ids indexed meanwhile by a concurrent
+        call are skipped, so the same message is never stored twice.
+        """
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry is None:
+                entry = self._chats[chat_id] = _ChatIndex(vectors.shape[1])
+            self._chats.move_to_end(chat_id)
+            rows = []
+            for row, (message_id, text) in enumerate(messages):
+                if message_id in entry.known:
+                    continue
+                entry.ids.append(message_id)
+                entry.texts.append(text)
+                entry.known.add(message_id)
+                rows.append(row)
+            entry.vectors = np.vstack([entry.vectors, vectors[rows]])
+            overflow = len(entry.ids) - self.max_messages
+            if overflow > 0:
+                entry.known.difference_update(entry.ids[:overflow])
+                del entry.ids[:overflow]
+                del entry.texts[:overflow]
+                entry.vectors = entry.vectors[overflow:]
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+            return len(rows)
+
+    async def index(self, chat_id: str, messages: list) -> int:
+        """Embeds and adds the messages not yet indexed; returns how many."""
+        fresh = self.unseen(chat_id, messages)
+        if not fresh:
+            return 0
+        vectors = await self.embedder.aembed_many([text for _, text in fresh])
+        return self.add(chat_id, fresh, vectors)
+
+    def size(self, chat_id: str) -> int:
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            return len(entry.ids) if entry is not None else 0
+
+    def search(self, chat_id: str, vector, exclude=()) -> list:
+        """
+        Texts of the top-k messages scoring at least `min_score` against the
+        question vector, in chat order. Texts in `exclude` (the recent window
+        already in the prompt) are skipped.
+        """
+        with self._lock:
+            entry = self._chats.get(chat_id)
+            if entry is None or not entry.ids:
+                return []
+            self._chats.move_to_end(chat_id)
+            self.searches += 1
+            scores = entry.vectors @ vector
+            candidates = np.argsort(-scores)[:self.top_k + len(exclude)]
+            picked = [i for i in candidates
+                      if scores[i] >= self.min_score and entry.texts[i] not in exclude][:self.top_k]
+            return [entry.texts[i] for i in sorted(picked)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "chats": len(self._chats),
+                "messages": sum(len(entry.ids) for entry in self._chats.values()),
+                "searches": self.searches,
+            }
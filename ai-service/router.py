@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+
+# Faster local model for trivial questions (e.g. "llama3.2:3b"); pull it on
+# every backend and list it in WARM_MODELS as well to keep it loaded. Unset,
+# everything goes to the large model.
+SMALL_MODEL = os.getenv("SMALL_MODEL", "")
+# Limits beyond which a question is not trivial
+ROUTER_SMALL_MAX_QUESTION_CHARS = int(os.getenv("ROUTER_SMALL_MAX_QUESTION_CHARS", "160"))
+ROUTER_SMALL_MAX_HISTORY_TOKENS = int(os.getenv("ROUTER_SMALL_MAX_HISTORY_TOKENS", "1024"))
+# Words that signal reasoning over the conversation, matched as word prefixes
+ROUTER_LARGE_KEYWORDS = os.getenv(
+    "ROUTER_LARGE_KEYWORDS",
+    "analy,summar,explain,why,compare,conflict,feel,emotion,advice,advise,recommend,"
+    "plan,decide,pros,cons,code,debug,translate,write,draft,review,step",
+)
+
+SMALL = "small"
+LARGE = "large"
+
+
+class Route:
+    """Where one request goes, and why."""
+
+    def __init__(self, name: str, model: str, reason: str):
+        self.name = name
+        self.model = model
+        self.reason = reason
+
+
+class ModelRouter:
+    """
+    Sends trivial interactive questions to a small, fast model and the rest
+    to the large one, using only cheap request features: mode, question
+    length, history size and keywords that signal reasoning. A small-model
+    request that fails or produces nothing is escalated to the large model,
+    and once a backend reports the small model missing, routing is turned
+    off until restart.
+
+    Counts per route and reason, escalations and latency are kept for
+    /router/stats and exported as Prometheus metrics, so the thresholds can
+    be tuned from real traffic.
+    """
+
+    def __init__(self, large_model: str, estimate, small_model=SMALL_MODEL,
+                 max_question_chars=ROUTER_SMALL_MAX_QUESTION_CHARS,
+                 max_history_tokens=ROUTER_SMALL_MAX_HISTORY_TOKENS, keywords=ROUTER_LARGE_KEYWORDS):
+        self.large_model = large_model
+        self.small_model = small_model
+        self.estimate = estimate
+        self.max_question_chars = max_question_chars
+        self.max_history_tokens = max_history_tokens
+        words = [re.escape(word.strip().lower()) for word in keywords.split(",") if word.strip()]
+        self._keywords = re.compile(r"\b(?:" + "|".join(words) + r")", re.IGNORECASE) if words else None
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._escalations = {}
+        self._missing = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.small_model) and self.small_model != self.large_model and not self._missing
+
+    def model_missing(self):
+        """Sends everything to the large model from now on; the small one is not installed."""
+        self._missing = True
+
+    def route(self, mode: str, history: str, question: str) -> Route:
+        question = question.strip()
+        if not self.enabled:
+            return self._count(Route(LARGE, self.large_model, "disabled"))
+        if mode != "ask":
+            return self._count(Route(LARGE, self.large_model, mode))
+        if not question:
+            return self._count(Route(LARGE, self.large_model, "no_question"))
+        if len(question) > self.max_question_chars:
+            return self._count(Route(LARGE, self.large_model, "long_question"))
+        if self._keywords is not None and self._keywords.search(question):
+            return self._count(Route(LARGE, self.large_model, "keyword"))
+        if self.estimate(history) > self.max_history_tokens:
+            return self._count(Route(LARGE, self.large_model, "long_history"))
+        return self._count(Route(SMALL, self.small_model, "trivial"))
+
+    def escalate(self, route: Route, reason: str) -> Route:
+        """The large-model route taken when the small model could not answer."""
+        with self._lock:
+            self._escalations[reason] = self._escalations.get(reason, 0) + 1
+        return self._count(Route(LARGE, self.large_model, f"escalated_{reason}"))
+
+    def observe(self, route: Route, elapsed: float):
+        """Records the time a routed generation took, from slot to final frame."""
+        with self._lock:
+            stats = self._entry(route.name)
+            stats["completed"] += 1
+            stats["latency_total"] += elapsed
+
+    def _count(self, route: Route) -> Route:
+        with self._lock:
+            stats = self._entry(route.name)
+            stats["requests"] += 1
+            stats["reasons"][route.reason] = stats["reasons"].get(route.reason, 0) + 1
+        return route
+
+    def _entry(self, name: str) -> dict:
+        return self._routes.setdefault(name, {"requests": 0, "reasons": {}, "completed": 0, "latency_total": 0.0})
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                name: {
+                    "model": self.small_model if name == SMALL else self.large_model,
+                    "requests": stats["requests"],
+                    "reasons": dict(stats["reasons"]),
+                    "avg_latency_ms": (round(stats["latency_total"] / stats["completed"] * 1000, 1)
+                                       if stats["completed"] else None),
+                }
+                for name, stats in self._routes.items()
+            }
+            return {
+                "enabled": self.enabled,
+                "small_model_missing": self._missing,
+                "routes": routes,
+                "escalations": dict(self._escalations),
+            }
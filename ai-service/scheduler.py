@@ -0,0 +1,162 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Generations allowed to run against the backend at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+# Of those, how many may be long analysis jobs, and how many batch items
+LLM_ANALYSIS_CONCURRENCY = int(os.getenv("LLM_ANALYSIS_CONCURRENCY", "1"))
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "1"))
+# Map calls of analyses (ANALYSIS_MAP_TOKENS each) running at once; like
+# every lane but the interactive one, they are held to LLM_MAX_CONCURRENCY - 1
+# slots, so raise that as well for maps to run in parallel
+LLM_MAP_CONCURRENCY = int(os.getenv("LLM_MAP_CONCURRENCY", "4"))
+# Requests allowed to wait per lane before new ones are rejected
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "32"))
+# Seconds a request may wait for a slot before giving up
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+
+INTERACTIVE = "interactive"
+ANALYSIS = "analysis"
+MAP = "map"
+BATCH = "batch"
+
+# Lanes in priority order; a free slot always goes to the first lane waiting
+LANES = (INTERACTIVE, ANALYSIS, MAP, BATCH)
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request cannot be admitted. `status` is the HTTP code."""
+
+    def __init__(self, status: int, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class Scheduler:
+    """
+    Admission control in front of the model backend. At most
+    `concurrency` generations run at once; waiting requests are queued per
+    lane and a freed slot goes to the interactive lane before the analysis
+    lane, and to the analysis lane before the map and batch lanes. The
+    analysis, map and batch lanes each have their own cap, and together
+    they never take the last slot when there is more than one, so an
+    interactive request never waits behind background work. A full lane
+    queue is rejected with 429 straight away and a request that
+    waits longer than `queue_timeout` gets a 503.
+    """
+
+    def __init__(self, concurrency=LLM_MAX_CONCURRENCY, analysis_concurrency=LLM_ANALYSIS_CONCURRENCY,
+                 batch_concurrency=LLM_BATCH_CONCURRENCY, map_concurrency=LLM_MAP_CONCURRENCY,
+                 queue_limit=LLM_QUEUE_LIMIT, queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        # Slots the non-interactive lanes may hold between them
+        self.background_limit = max(1, concurrency - 1)
+        self.lane_limits = {
+            INTERACTIVE: concurrency,
+            ANALYSIS: max(1, min(analysis_concurrency, self.background_limit)),
+            MAP: max(1, min(map_concurrency, self.background_limit)),
+            BATCH: max(1, min(batch_concurrency, self.background_limit)),
+        }
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self._running = 0
+        self._active = {lane: 0 for lane in LANES}
+        self._waiters = {lane: deque() for lane in LANES}
+        self.rejected = {lane: 0 for lane in LANES}
+        self.timed_out = {lane: 0 for lane in LANES}
+
+    def _can_start(self, lane: str) -> bool:
+        if self._running >= self.concurrency or self._active[lane] >= self.lane_limits[lane]:
+            return False
+        return lane == INTERACTIVE or self._running - self._active[INTERACTIVE] < self.background_limit
+
+    def _start(self, lane: str):
+        self._running += 1
+        self._active[lane] += 1
+
+    def check(self, lane: str):
+        """Fast admission check for callers that must reject before streaming."""
+        if len(self._waiters[lane]) >= self.queue_limit and not self._can_start(lane):
+            self.rejected[lane] += 1
+            raise SchedulerRejected(429, f"The {lane} queue is full. Please try again shortly.")
+
+    async def acquire(self, lane: str, admitted: bool = False) -> float:
+        """
+        Waits for a slot in `lane` and returns the time spent queued, in
+        seconds. `admitted` is for follow-up work of a request that already
+        passed admission (e.g. the map calls of one analysis): it is queued
+        in the lane like anything else but never rejected.
+        """
+        higher_waiting = any(self._waiters[l] for l in LANES[:LANES.index(lane) + 1])
+        if not higher_waiting and self._can_start(lane):
+            self._start(lane)
+            return 0.0
+
+        if not admitted:
+            self.check(lane)
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, None if admitted else self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out[lane] += 1
+            raise SchedulerRejected(503, "The model is busy right now. Please try again in a moment.",
+                                    retry_after=int(self.queue_timeout))
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted in the same tick we were cancelled; hand the slot on
+                self.release(lane)
+            raise
+        finally:
+            if waiter in self._waiters[lane]:
+                self._waiters[lane].remove(waiter)
+        return time.perf_counter() - started
+
+    def release(self, lane: str):
+        self._running -= 1
+        self._active[lane] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.concurrency:
+            for lane in LANES:
+                queue = self._waiters[lane]
+                while queue and queue[0].done():
+                    queue.popleft()
+                if queue and self._can_start(lane):
+                    self._start(lane)
+                    queue.popleft().set_result(None)
+                    break
+            else:
+                return
+
+    @asynccontextmanager
+    async def slot(self, lane: str, admitted: bool = False):
+        """Holds a backend slot for the body; yields the queue wait in seconds."""
+        waited = await self.acquire(lane, admitted)
+        try:
+            yield waited
+        finally:
+            self.release(lane)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self._running,
+            "lanes": {
+                lane: {
+                    "running": self._active[lane],
+                    "limit": self.lane_limits[lane],
+                    "queued": len(self._waiters[lane]),
+                    "rejected": self.rejected[lane],
+                    "timed_out": self.timed_out[lane],
+                }
+                for lane in LANES
+            },
+        }
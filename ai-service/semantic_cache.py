@@ -0,0 +1,85 @@
+import os
+import threading
+from collections import OrderedDict
+
+from embeddings import Embedder, np
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") not in ("0", "false", "False")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SCOPES = int(os.getenv("SEMANTIC_CACHE_SCOPES", "2048"))
+SEMANTIC_CACHE_PER_SCOPE = int(os.getenv("SEMANTIC_CACHE_PER_SCOPE", "32"))
+
+
+class _Scope:
+    """Answers given over one history version, with their question vectors."""
+
+    def __init__(self, dimensions: int):
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+        self.answers = []
+
+
+class SemanticCache:
+    """
+    Reuses an answer when a new question means the same as one already
+    answered over the same conversation. Questions are embedded with
+    sentence-transformers and compared by cosine similarity against the
+    questions answered for that scope (model, mode and normalized history),
+    so an answer is never reused across chats or after the history changed.
+
+    Scopes are evicted least recently used and each keeps its newest
+    SEMANTIC_CACHE_PER_SCOPE questions. Disabled when sentence-transformers
+    is not installed.
+    """
+
+    def __init__(self, embedder: Embedder, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_scopes=SEMANTIC_CACHE_SCOPES, max_per_scope=SEMANTIC_CACHE_PER_SCOPE,
+                 enabled=SEMANTIC_CACHE_ENABLED):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_scopes = max_scopes
+        self.max_per_scope = max_per_scope
+        self.enabled = enabled and embedder.available
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, scope: str, vector) -> tuple:
+        """Returns (answer, similarity) for the closest match above the threshold, or None."""
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is not None and entry.answers:
+                scores = entry.vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._scopes.move_to_end(scope)
+                    self.hits += 1
+                    return entry.answers[best], float(scores[best])
+            self.misses += 1
+            return None
+
+    def add(self, scope: str, vector, answer: str):
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None:
+                entry = self._scopes[scope] = _Scope(vector.shape[0])
+            self._scopes.move_to_end(scope)
+            entry.vectors = np.vstack([entry.vectors, vector[None, :]])[-self.max_per_scope:]
+            entry.answers = (entry.answers + [answer])[-self.max_per_scope:]
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,47 @@
+# Runs the service against fake_ollama.FakeOllama; from ai-service: python -m pytest tests
+
+import os
+import sys
+import socket
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# The service reads its backends at import, so point it at the fake first.
+# Nothing is warmed up, so the fake only sees the tests' own requests.
+FAKE_PORT = free_port()
+os.environ["OLLAMA_BASE_URLS"] = f"http://127.0.0.1:{FAKE_PORT}"
+os.environ["WARM_MODELS"] = ""
+
+from fake_ollama import FakeOllama, Server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def fake():
+    fake = FakeOllama()
+    with Server(fake.app, FAKE_PORT):
+        yield fake
+
+
+@pytest.fixture(scope="session")
+def service(fake):
+    """The ai-service app on a real socket, so clients can hang up mid-answer."""
+    import app
+    with Server(app.app, free_port()) as server:
+        yield server
+
+
+@pytest.fixture
+def slow(fake):
+    """A fake whose answers take 5 seconds, with fresh counters."""
+    fake.reset()
+    fake.token_delay, fake.tokens = 0.1, 50
+    yield fake
+    fake.token_delay, fake.tokens = 0.05, 20
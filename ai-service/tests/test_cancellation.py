@@ -0,0 +1,79 @@
+import time
+from contextlib import ExitStack
+import httpx
+import app
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the upstream generation to end"
+        time.sleep(0.05)
+
+
+def assert_cancelled(fake):
+    """The one generation was aborted upstream and its scheduler slot freed."""
+    wait_for(lambda: fake.running == 0)
+    stats = fake.stats()
+    assert (stats["calls"], stats["completed"], stats["cancelled"]) == (1, 0, 1)
+    wait_for(lambda: app.scheduler.stats()["running"] == 0)
+
+
+def test_ask_hang_up_cancels_generation(service, slow):
+    with httpx.Client() as client:
+        try:
+            client.post(f"{service.url}/ask", json={"question": "hang up on ask", "no_cache": True}, timeout=1)
+        except httpx.ReadTimeout:
+            pass
+    assert_cancelled(slow)
+
+
+def test_ask_deadline_cancels_generation(service, slow):
+    response = httpx.post(f"{service.url}/ask", json={"question": "ask past deadline", "no_cache": True},
+                          headers={"X-Deadline-Ms": "1000"}, timeout=10)
+    assert response.status_code == 200
+    assert "too long" in response.json()["answer"]
+    assert_cancelled(slow)
+
+
+def test_stream_hang_up_cancels_generation(service, slow):
+    with httpx.stream("POST", f"{service.url}/ask/stream",
+                      json={"question": "hang up on stream", "no_cache": True}, timeout=10) as response:
+        after_first_token(response)
+    assert_cancelled(slow)
+
+
+def test_stream_deadline_cancels_generation(service, slow):
+    with httpx.stream("POST", f"{service.url}/ask/stream",
+                      json={"question": "stream past deadline", "no_cache": True, "deadline_ms": 1000},
+                      timeout=10) as response:
+        events = list(response.iter_lines())
+    assert any(line == "event: error" for line in events)
+    assert_cancelled(slow)
+
+
+def after_first_token(response):
+    """The response's remaining lines, once its first token has arrived."""
+    lines = response.iter_lines()
+    for line in lines:
+        if '"token"' in line:
+            return lines
+
+
+def test_coalesced_caller_hang_up_keeps_generation(service, slow):
+    slow.tokens = 20
+    body = {"question": "shared by two callers"}
+    with httpx.Client(timeout=10) as client, ExitStack() as leaving:
+        # Holds on to the line iterator; dropping it would close the response
+        held = after_first_token(leaving.enter_context(client.stream("POST", f"{service.url}/ask/stream", json=body)))
+        # Joins the generation the first caller started
+        with client.stream("POST", f"{service.url}/ask/stream", json=body) as staying:
+            rest = after_first_token(staying)
+            leaving.close()
+            events = list(rest)
+    assert "event: done" in events
+    assert held is not None
+    wait_for(lambda: slow.running == 0)
+    assert slow.stats()["calls"] == 1
+    assert slow.stats()["completed"] == 1
+    assert slow.stats()["cancelled"] == 0
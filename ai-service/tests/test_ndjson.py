@@ -0,0 +1,82 @@
+import json
+import random
+import pytest
+from ollama_client import NDJSONParser, ResponseAccumulator
+
+
+def synthetic_stream(tokens: int, seed: int = 0) -> tuple:
+    """An Ollama generate body of `tokens` frames, its text and its final object."""
+    rng = random.Random(seed)
+    vocabulary = ["hello", " world", " ünïcödé", " 東京", " 🙂", "\n", " \"quoted\"", " back\\slash", ""]
+    lines, parts = [], []
+    for _ in range(tokens):
+        token = rng.choice(vocabulary)
+        parts.append(token)
+        lines.append(json.dumps({"model": "llama3:instruct", "response": token, "done": False},
+                                ensure_ascii=rng.random() < 0.5))
+    final = {"model": "llama3:instruct", "response": "", "done": True, "done_reason": "stop",
+             "prompt_eval_count": 812, "eval_count": tokens, "eval_duration": 123456789}
+    lines.append(json.dumps(final))
+    return "\n".join(lines).encode("utf-8"), "".join(parts), final
+
+
+def chunks(body: bytes, rng: random.Random, largest: int):
+    """`body` cut at random byte offsets, including inside multi-byte characters."""
+    i = 0
+    while i < len(body):
+        size = rng.randint(1, largest)
+        yield body[i:i + size]
+        i += size
+
+
+# Byte-sized chunks are slow to feed, so those streams are shorter
+@pytest.mark.parametrize("largest, tokens", [(1, 5_000), (7, 20_000), (4096, 200_000), (65536, 200_000)])
+def test_large_stream_in_random_chunks(largest, tokens):
+    body, text, final = synthetic_stream(tokens)
+    rng = random.Random(largest)
+    parser, accumulator = NDJSONParser(), ResponseAccumulator()
+    objects = longest_buffer = 0
+    for chunk in chunks(body, rng, largest):
+        for obj in parser.feed(chunk):
+            accumulator.add(obj)
+            objects += 1
+        longest_buffer = max(longest_buffer, len(parser._buffer))
+    # The body has no trailing newline, so the final object arrives on close
+    for obj in parser.close():
+        accumulator.add(obj)
+        objects += 1
+
+    assert objects == tokens + 1
+    assert accumulator.text == text
+    assert accumulator.result() == {**final, "response": text}
+    # Only the unterminated tail of one line is ever held
+    assert longest_buffer < largest + 200
+
+
+def test_blank_lines_and_trailing_newline():
+    body, text, final = synthetic_stream(1000, seed=1)
+    body = body.replace(b"\n", b"\n\n") + b"\n"
+    parser, accumulator = NDJSONParser(), ResponseAccumulator()
+    for chunk in chunks(body, random.Random(1), 64):
+        for obj in parser.feed(chunk):
+            accumulator.add(obj)
+    assert parser.close() == []
+    assert accumulator.result() == {**final, "response": text}
+
+
+def test_stream_without_final_object_is_an_error():
+    body, _, _ = synthetic_stream(1000, seed=2)
+    body = body[:body.rindex(b"\n")]
+    parser, accumulator = NDJSONParser(), ResponseAccumulator()
+    for obj in parser.feed(body) + parser.close():
+        accumulator.add(obj)
+    with pytest.raises(ValueError):
+        accumulator.result()
+
+
+def test_truncated_line_is_an_error():
+    body, _, _ = synthetic_stream(10, seed=3)
+    parser = NDJSONParser()
+    parser.feed(body[:-5])
+    with pytest.raises(ValueError):
+        parser.close()
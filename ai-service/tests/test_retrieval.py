@@ -0,0 +1,32 @@
+import asyncio
+import numpy as np
+import retrieval
+from retrieval import MessageIndex
+
+
+class LetterEmbedder:
+    """One dimension per letter, with a pause in encoding like the real model's thread hop."""
+    available = True
+
+    def embed(self, text: str):
+        vector = np.zeros(26, dtype=np.float32)
+        vector[ord(text[0]) - ord("a")] = 1.0
+        return vector
+
+    async def aembed_many(self, texts: list):
+        await asyncio.sleep(0.01)
+        return np.stack([self.embed(text) for text in texts])
+
+
+def test_concurrent_posts_of_the_same_ids_index_them_once(monkeypatch):
+    # embeddings leaves numpy unset when sentence-transformers is missing
+    monkeypatch.setattr(retrieval, "np", np)
+    embedder = LetterEmbedder()
+    index = MessageIndex(embedder, min_score=0.5)
+
+    async def post_twice():
+        return await asyncio.gather(index.index("g", [("1", "a"), ("2", "b")]), index.index("g", [("2", "b")]))
+
+    assert sorted(asyncio.run(post_twice())) == [0, 2]
+    assert index.size("g") == 2
+    assert index.search("g", embedder.embed("b")) == ["b"]
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import logging
+import threading
+import urllib.request
+from datetime import datetime
+
+from budget import LLM_NUM_CTX
+
+logger = logging.getLogger(__name__)
+
+# How long Ollama keeps a model loaded after a request: a duration such as
+# "30m", or seconds (-1 keeps it loaded indefinitely). Sent on every request.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Comma-separated models to load at startup and keep resident
+WARM_MODELS = os.getenv("WARM_MODELS", "llama3:instruct")
+# Local hours ("8-20" is 08:00 to 19:59) and weekdays during which the
+# keeper holds the models resident; outside them keep_alive is left to lapse
+KEEP_WARM_HOURS = os.getenv("KEEP_WARM_HOURS", "8-20")
+KEEP_WARM_DAYS = os.getenv("KEEP_WARM_DAYS", "mon,tue,wed,thu,fri")
+KEEP_WARM_INTERVAL = float(os.getenv("KEEP_WARM_INTERVAL", "120"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "300"))
+
+_DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def keep_alive_value(value: str = OLLAMA_KEEP_ALIVE):
+    """Ollama takes keep_alive as a duration string or a number of seconds."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def parse_hours(value: str) -> tuple:
+    start, _, end = value.partition("-")
+    return int(start), int(end or 24)
+
+
+def parse_days(value: str) -> set:
+    return {_DAYS.index(day.strip().lower()[:3]) for day in value.split(",") if day.strip()}
+
+
+class ModelKeeper:
+    """
+    Loads the configured models on every backend at startup with a one-token
+    priming generation, so the first real request does not pay the model
+    load, and keeps them resident during business hours by re-sending a
+    load request (an empty prompt, which Ollama answers without generating)
+    before keep_alive runs out.
+
+    The service reports ready once each model has been primed on at least
+    one backend. Runs in a daemon thread, like the backend health checks.
+    """
+
+    def __init__(self, backends, models=None, keep_alive=None, hours=KEEP_WARM_HOURS,
+                 days=KEEP_WARM_DAYS, interval=KEEP_WARM_INTERVAL, num_ctx=LLM_NUM_CTX):
+        self.backends = backends
+        self.models = models or [m.strip() for m in WARM_MODELS.split(",") if m.strip()]
+        self.keep_alive = keep_alive if keep_alive is not None else keep_alive_value()
+        self.hours = parse_hours(hours)
+        self.days = parse_days(days)
+        self.interval = interval
+        self.num_ctx = num_ctx
+        self._state = {}
+        self._primed = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def business_hours(self, now: datetime = None) -> bool:
+        now = now or datetime.now()
+        start, end = self.hours
+        return now.weekday() in self.days and start <= now.hour < end
+
+    def _post(self, url: str, payload: dict, timeout: float) -> dict:
+        request = urllib.request.Request(f"{url}/api/generate", data=json.dumps(payload).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def _load(self, backend, model: str, prime: bool) -> bool:
+        # num_ctx must match what real requests send, or Ollama reloads the model for them
+        payload = {"model": model, "stream": False, "keep_alive": self.keep_alive,
+                   "options": {"num_ctx": self.num_ctx}}
+        if prime:
+            payload["prompt"] = "Hi"
+            payload["options"]["num_predict"] = 1
+        started = time.monotonic()
+        try:
+            self._post(backend.url, payload, WARMUP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not load {model} on {backend.url}: {e}")
+            self._record(backend.url, model, hot=False)
+            return False
+        self._record(backend.url, model, hot=True, elapsed=time.monotonic() - started)
+        if prime:
+            with self._lock:
+                self._primed.add(model)
+            logger.info(f"{model} is warm on {backend.url} ({time.monotonic() - started:.1f}s)")
+        return True
+
+    def _record(self, url: str, model: str, hot: bool, elapsed: float = None):
+        with self._lock:
+            state = self._state.setdefault((url, model), {"loads": 0, "failures": 0})
+            state["hot"] = hot
+            state["checked_at"] = time.time()
+            if hot:
+                state["loads"] += 1
+                state["last_load_ms"] = round(elapsed * 1000, 1)
+            else:
+                state["failures"] += 1
+
+    def warm(self):
+        """Primes every model on every backend; later passes only refresh keep_alive."""
+        for backend in self.backends.backends:
+            for model in self.models:
+                with self._lock:
+                    primed = (backend.url, model) in self._state and self._state[backend.url, model]["hot"]
+                self._load(backend, model, prime=not primed)
+
+    def ready(self) -> bool:
+        with self._lock:
+            return all(model in self._primed for model in self.models)
+
+    def start(self):
+        """Warms up now, then keeps the models resident from a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def run():
+            self.warm()
+            while not self._stop.wait(self.interval):
+                if not self.ready() or self.business_hours():
+                    self.warm()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="ollama-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": all(model in self._primed for model in self.models),
+                "business_hours": self.business_hours(),
+                "keep_alive": self.keep_alive,
+                "models": [{"backend": url, "model": model, **state}
+                           for (url, model), state in self._state.items()],
+            }
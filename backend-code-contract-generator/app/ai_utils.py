@@ -5,11 +5,15 @@ from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+from ollama import ResponseError
 from pydantic import BaseModel, Field
 from jinja2 import Environment, FileSystemLoader
 import os
+import time
+import httpx
 from datetime import datetime
 from typing import Optional
+from app.backend_pool import BackendPool
 
 # --- MODIFIED DATA STRUCTURE ---
 # Changed field names for clarity (e.g., commission_name -> client_name)
@@ -34,9 +38,11 @@ vectorstore = Chroma(persist_directory=DB_DIR, embedding_function=embeddings)
 retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
 
 MODEL = "llama3:instruct"
-OLLAMA_URL = "http://localhost:11434"
 
-llm = Ollama(model=MODEL, base_url=OLLAMA_URL, format="json")
+# Ollama instances from OLLAMA_BASE_URLS, routed by least outstanding requests
+backends = BackendPool()
+backends.start_health_checks()
+
 parser = JsonOutputParser(pydantic_object=ContractDetails)
 
 # --- IMPROVED PROMPT TEMPLATE ---
@@ -67,11 +73,33 @@ prompt = ChatPromptTemplate.from_template(prompt_template)
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
-rag_chain = {
-    "context": retriever | format_docs,
-    "conversation": RunnablePassthrough(),
-    "format_instructions": lambda x: parser.get_format_instructions()
-} | prompt | llm | parser
+# One chain per backend; they share the retriever, prompt and parser
+_rag_chains = {}
+
+def rag_chain_for(base_url: str):
+    chain = _rag_chains.get(base_url)
+    if chain is None:
+        llm = Ollama(model=MODEL, base_url=base_url, format="json")
+        chain = _rag_chains[base_url] = {
+            "context": retriever | format_docs,
+            "conversation": RunnablePassthrough(),
+            "format_instructions": lambda x: parser.get_format_instructions()
+        } | prompt | llm | parser
+    return chain
+
+def backend_failed(error: Exception) -> bool:
+    """
+    Whether an error from the chain is the backend's fault: it could not be
+    reached, timed out or answered with a 5xx. Bad JSON is not.
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+
+def refused(error: Exception) -> bool:
+    """The backend could not be reached at all, so nothing ran and another one can be tried."""
+    return isinstance(error, (ConnectionError, httpx.ConnectError))
 
 # --- MODIFIED FUNCTION ---
 # This now cleans the transcript by removing asterisks before sending it to the AI.
@@ -79,6 +107,22 @@ def generate_contract(conversation: str) -> str:
     # Pre-process the transcript to remove markdown characters
     cleaned_conversation = conversation.replace('**', '')
     
-    extracted_data = rag_chain.invoke(cleaned_conversation)
+    # A backend that refuses the connection is reported and the next untried one is used
+    tried = []
+    for attempt in range(len(backends.backends)):
+        backend = backends.acquire(exclude=tried)
+        tried.append(backend)
+        started = time.monotonic()
+        failed = False
+        try:
+            extracted_data = rag_chain_for(backend.url).invoke(cleaned_conversation)
+            break
+        except Exception as e:
+            # Only backend failures count against it, not bad JSON
+            failed = backend_failed(e)
+            if not refused(e) or attempt + 1 == len(backends.backends):
+                raise
+        finally:
+            backends.release(backend, ok=not failed, elapsed=time.monotonic() - started)
     contract_text = template.render(extracted_data)
     return contract_text
\ No newline at end of file
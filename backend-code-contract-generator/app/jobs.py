@@ -0,0 +1,136 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Contract jobs processed at once. Transcription runs in the inference
+# processes, so this can match INFERENCE_PROCESSES; a higher value lets one
+# job's LLM and PDF stages overlap another's transcription.
+CONTRACT_WORKERS = int(os.getenv("CONTRACT_WORKERS", "2"))
+# Jobs allowed to wait for a worker before new uploads are turned away
+CONTRACT_QUEUE_LIMIT = int(os.getenv("CONTRACT_QUEUE_LIMIT", "16"))
+# Seconds a finished job stays queryable
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while CONTRACT_QUEUE_LIMIT jobs are waiting."""
+
+
+class Job:
+    """One submitted upload and what has happened to it so far."""
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Bumped on every change so progress streams can tell what is new
+        self.version = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a bounded pool of worker threads so long audio
+    work never runs on the event loop. `run(job, report)` does the work and
+    returns the job's result; it calls `report(stage, progress)` as it goes.
+
+    Jobs live in memory, so they are lost on restart and are only visible
+    to the process that accepted them. Finished jobs are dropped after
+    `ttl` seconds.
+    """
+
+    def __init__(self, run, workers=CONTRACT_WORKERS, queue_limit=CONTRACT_QUEUE_LIMIT, ttl=JOB_TTL):
+        self.run = run
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="contract-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: Job, *args) -> Job:
+        with self._lock:
+            self._prune()
+            waiting = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if waiting >= self.queue_limit:
+                raise QueueFull(f"{waiting} jobs are already waiting. Please try again later.")
+            self._jobs[job.id] = job
+        self._executor.submit(self._work, job, *args)
+        logger.info(f"Queued job {job.id} for {job.filename}")
+        return job
+
+    def snapshot(self, job_id: str):
+        """`(version, job dict)` read consistently, or None for an unknown job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else (job.version, job.to_dict())
+
+    def _update(self, job: Job, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+
+    def _work(self, job: Job, *args):
+        self._update(job, status=RUNNING, started_at=time.time())
+
+        def report(stage: str, progress: int):
+            self._update(job, stage=stage, progress=progress)
+
+        try:
+            result = self.run(job, report, *args)
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            self._update(job, status=FAILED, stage=FAILED, error=str(e), finished_at=time.time())
+            return
+        self._update(job, status=DONE, stage=DONE, progress=100, result=result, finished_at=time.time())
+        logger.info(f"Job {job.id} done in {job.finished_at - job.started_at:.1f}s")
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {"workers": self.workers, "queue_limit": self.queue_limit, "jobs": counts}
@@ -0,0 +1,96 @@
+# --- backend/app/speakers.py ---
+import numpy as np
+
+UNKNOWN = "UNKNOWN"
+# Longer turns are indexed as pieces of this many seconds, so one long turn
+# cannot widen the search window of every word after it
+MAX_TURN_PIECE = 30.0
+
+
+def assign_speakers(speaker_turns: list, words: list) -> list:
+    """
+    Picks a speaker for every word: the one whose turns overlap the word's
+    [start, end] the most, or on a tie the one whose turn started first. A
+    word that overlaps no turn by any length (e.g. a zero-length word) goes
+    to a turn containing its midpoint, otherwise it is UNKNOWN. Returns one
+    label per word, in order.
+
+    Turns are sorted by start once. For each word, every turn that can
+    overlap it lies between two binary searches: the first turn whose
+    running-maximum end reaches the word's start, and the last turn
+    starting before the word's end. With turns cut into pieces of at most
+    MAX_TURN_PIECE seconds, that window only holds the turns near the word.
+    The candidates of all words are scored at once, so the cost is about
+    O((words + turns) log turns) rather than words × turns.
+    """
+    if not words:
+        return []
+    if not speaker_turns:
+        return [UNKNOWN] * len(words)
+
+    turns = sorted(speaker_turns, key=lambda turn: turn['start'])
+    labels, turn_speaker = np.unique([turn['speaker'] for turn in turns], return_inverse=True)
+    turn_start = np.array([turn['start'] for turn in turns], dtype=np.float64)
+    turn_end = np.array([turn['end'] for turn in turns], dtype=np.float64)
+    # Pieces remember the sorted turn they came from, which breaks ties
+    turn_start, turn_end, turn_speaker, turn_origin = _split_turns(turn_start, turn_end, turn_speaker)
+    # Turns may overlap, so ends are not sorted; their running maximum is
+    reach = np.maximum.accumulate(turn_end)
+
+    word_start = np.array([word['start'] for word in words], dtype=np.float64)
+    word_end = np.array([word.get('end', word['start']) for word in words], dtype=np.float64)
+    word_end = np.maximum(word_end, word_start)
+
+    # Candidate turns of word i are first[i]:last[i]
+    first = np.searchsorted(reach, word_start, side='left')
+    last = np.searchsorted(turn_start, word_end, side='right')
+    counts = np.maximum(last - first, 0)
+
+    # One row per (word, candidate turn) pair
+    word_index = np.repeat(np.arange(len(words)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    turn_index = np.repeat(first, counts) + offsets
+
+    starts = np.maximum(word_start[word_index], turn_start[turn_index])
+    ends = np.minimum(word_end[word_index], turn_end[turn_index])
+    overlap = np.clip(ends - starts, 0, None)
+    middle = (word_start[word_index] + word_end[word_index]) / 2
+    inside = (turn_start[turn_index] <= middle) & (middle <= turn_end[turn_index])
+
+    # Per word and speaker: total overlap, midpoint containment, and the
+    # speaker's earliest candidate turn, which breaks ties
+    shape = (len(words), len(labels))
+    speaker_index = turn_speaker[turn_index]
+    scores = np.zeros(shape)
+    np.add.at(scores, (word_index, speaker_index), overlap)
+    contains = np.zeros(shape, dtype=bool)
+    contains[word_index[inside], speaker_index[inside]] = True
+    never = np.iinfo(np.int64).max
+    earliest = np.full(shape, never)
+    # Only turns that overlap the word (or hold its midpoint) compete
+    counted = (overlap > 0) | inside
+    np.minimum.at(earliest, (word_index[counted], speaker_index[counted]), turn_origin[turn_index][counted])
+
+    best_score = scores.max(axis=1, keepdims=True)
+    eligible = (scores > 0) & (scores >= best_score - 1e-9)
+    no_overlap = best_score[:, 0] <= 0
+    eligible[no_overlap] = contains[no_overlap]
+    best = np.where(eligible, earliest, never).argmin(axis=1)
+    found = eligible.any(axis=1)
+    return [str(labels[b]) if ok else UNKNOWN for b, ok in zip(best, found)]
+
+
+def _split_turns(start, end, speaker):
+    """
+    Cuts turns longer than MAX_TURN_PIECE into back-to-back pieces, keeping
+    them sorted by start. Also returns each piece's original turn index.
+    """
+    pieces = np.maximum(np.ceil((end - start) / MAX_TURN_PIECE).astype(np.int64), 1)
+    if (pieces == 1).all():
+        return start, end, speaker, np.arange(len(start))
+    turn = np.repeat(np.arange(len(start)), pieces)
+    offset = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    piece_start = start[turn] + offset * MAX_TURN_PIECE
+    piece_end = np.minimum(piece_start + MAX_TURN_PIECE, end[turn])
+    order = np.argsort(piece_start, kind='stable')
+    return piece_start[order], piece_end[order], speaker[turn][order], turn[order]
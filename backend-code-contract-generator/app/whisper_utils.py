@@ -1,9 +1,18 @@
 # --- backend/app/whisper_utils.py ---
 import whisper
+import torch
+import numpy as np
 from pyannote.audio import Pipeline
 import os
+import time
 import logging
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
+from app.speakers import assign_speakers
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -13,73 +22,197 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 HUGGING_FACE_TOKEN = os.getenv("HUGGING_FACE_TOKEN")
 
+# --- Inference Pool ---
+# Recordings are transcribed in separate worker processes, so several can
+# run in parallel and torch never holds up the web process. Each worker
+# loads the models once and keeps them for its lifetime.
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "2"))
+# torch threads per worker; by default the cores are split between workers
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // INFERENCE_PROCESSES))))
+
+# Both models take 16 kHz mono audio
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
 # --- Global Models ---
-# We load the models once when the application starts to save time on each request.
+# Set in each inference worker by load_models(); unused in the web process.
 whisper_model = None
 diarization_pipeline = None
 
-# --- Initialize Models ---
-try:
-    # 1. Load the Whisper model for transcription
-    whisper_model = whisper.load_model("base")
-    logger.info("Whisper model 'base' loaded successfully.")
 
-    # 2. Load the Pyannote model for speaker diarization
-    if HUGGING_FACE_TOKEN:
-        diarization_pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            use_auth_token=HUGGING_FACE_TOKEN
-        )
-        logger.info("Pyannote diarization pipeline loaded successfully.")
-    else:
-        logger.error("HUGGING_FACE_TOKEN not found. Diarization will not be available.")
+def load_models(torch_threads: int = TORCH_THREADS):
+    """Worker initializer: loads Whisper and Pyannote into this process."""
+    global whisper_model, diarization_pipeline
+    torch.set_num_threads(torch_threads)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        # 1. Load the Whisper model for transcription
+        whisper_model = whisper.load_model("base")
+        logger.info("Whisper model 'base' loaded successfully.")
+
+        # 2. Load the Pyannote model for speaker diarization
+        if HUGGING_FACE_TOKEN:
+            diarization_pipeline = Pipeline.from_pretrained(
+                "pyannote/speaker-diarization-3.1",
+                use_auth_token=HUGGING_FACE_TOKEN
+            )
+            logger.info("Pyannote diarization pipeline loaded successfully.")
+        else:
+            logger.error("HUGGING_FACE_TOKEN not found. Diarization will not be available.")
+
+    except Exception as e:
+        logger.error(f"Failed to load AI models: {e}", exc_info=True)
+
+
+def models_loaded() -> dict:
+    return {"pid": os.getpid(), "whisper": whisper_model is not None,
+            "diarization": diarization_pipeline is not None}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
 
-except Exception as e:
-    logger.error(f"Failed to load AI models: {e}", exc_info=True)
+def inference_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: forking a process that has touched torch can deadlock
+            _pool = ProcessPoolExecutor(max_workers=INFERENCE_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=load_models, initargs=(TORCH_THREADS,))
+        return _pool
 
 
-def transcribe_audio(audio_path: str) -> str:
+def start_inference_pool() -> list:
+    """Starts every worker now so the models load at startup, not on the first upload."""
+    pool = inference_pool()
+    workers = [pool.submit(models_loaded) for _ in range(INFERENCE_PROCESSES)]
+    return [worker.result() for worker in workers]
+
+
+def stop_inference_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TranscriptionError(Exception):
+    """Raised when an upload cannot be transcribed, so its job is marked failed."""
+
+
+def decode_audio(audio_path: str) -> str:
     """
-    Transcribes an audio file and assigns speakers to each segment.
-    Returns a formatted dialogue string.
+    Decodes and resamples the upload once, straight to a raw 16 kHz mono
+    float32 file next to it, and returns that file's path. ffmpeg writes it
+    without the samples passing through Python.
     """
-    if whisper_model is None or diarization_pipeline is None:
-        logger.error("Cannot transcribe because one or more AI models failed to load.")
-        if whisper_model: # If only diarization failed, return a simple transcript
-            return whisper_model.transcribe(audio_path)["text"]
-        return "Error: Transcription models not loaded."
+    pcm_path = f"{audio_path}.f32"
+    subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", audio_path,
+                    "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), pcm_path],
+                   check=True, capture_output=True)
+    return pcm_path
+
 
-    logger.info(f"Starting diarization for: {audio_path}")
+def load_waveform(pcm_path: str) -> np.ndarray:
+    """
+    The decoded samples, memory-mapped copy-on-write: both workers read the
+    same page-cache pages instead of each holding a decoded copy.
+    """
+    return np.asarray(np.memmap(pcm_path, dtype=np.float32, mode="c"))
+
+
+def transcribe_audio(audio_path: str, timings: dict = None) -> str:
+    """
+    Transcribes an audio file and assigns speakers to each segment.
+    Returns a formatted dialogue string, or raises TranscriptionError when
+    the audio cannot be processed or Whisper is not loaded.
+
+    The upload is decoded once (see decode_audio), then diarization and
+    Whisper, which share nothing until the merge, run at the same time on
+    two inference workers (each with its own share of the CPU threads) and
+    are merged here. Seconds spent per stage are written to `timings` when
+    given.
+    """
+    global _pool
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    pool = inference_pool()
+    pcm_path = None
+    logger.info(f"Starting diarization and transcription for: {audio_path}")
     try:
-        # 1. Get speaker segments from the diarization pipeline
-        diarization = diarization_pipeline(audio_path)
-        
-        # 2. Get word-level timestamps from Whisper
-        whisper_result = whisper_model.transcribe(audio_path, word_timestamps=True)
-        
+        pcm_path = decode_audio(audio_path)
+        timings["decode"] = time.perf_counter() - started
+        diarizing = pool.submit(_diarize, pcm_path)
+        transcribing = pool.submit(_whisper, pcm_path)
+        try:
+            speaker_turns, timings["diarize"] = diarizing.result()
+            whisper_result, timings["transcribe"] = transcribing.result()
+        finally:
+            transcribing.cancel()
+    except BrokenProcessPool:
+        # A worker died (most likely out of memory); start a fresh pool for the next job
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
     except Exception as e:
         logger.error(f"Error during transcription or diarization: {e}", exc_info=True)
-        return f"Error processing audio: {e}"
+        raise TranscriptionError(f"Error processing audio: {e}") from e
+    finally:
+        if pcm_path and os.path.exists(pcm_path):
+            os.remove(pcm_path)
 
-    logger.info("Combining transcription and diarization results...")
-    
-    # --- Combine Results ---
+    if whisper_result is None:
+        logger.error("Cannot transcribe because the Whisper model failed to load.")
+        raise TranscriptionError("Transcription models not loaded.")
+    if speaker_turns is None:
+        # If only diarization failed, return a simple transcript
+        logger.error("Diarization model not loaded; returning the transcript without speakers.")
+        return whisper_result["text"]
+
+    merging = time.perf_counter()
+    dialogue = merge_speakers(speaker_turns, whisper_result)
+    timings["merge"] = time.perf_counter() - merging
+    timings["total"] = time.perf_counter() - started
+    logger.info(f"Transcribed {audio_path} in {timings['total']:.1f}s (decode {timings['decode']:.1f}s, "
+                f"diarize {timings['diarize']:.1f}s, transcribe {timings['transcribe']:.1f}s, merge {timings['merge']:.2f}s)")
+    return dialogue
+
+
+def _diarize(pcm_path: str):
+    """Inference worker: speaker turns as plain dicts, and the seconds taken."""
+    if diarization_pipeline is None:
+        return None, 0.0
+    started = time.perf_counter()
+    # from_numpy wraps the mapped samples; pyannote takes (channel, time)
+    waveform = torch.from_numpy(load_waveform(pcm_path)).unsqueeze(0)
+    diarization = diarization_pipeline({"waveform": waveform, "sample_rate": SAMPLE_RATE})
     speaker_turns = []
     for turn, _, speaker in diarization.itertracks(yield_label=True):
         speaker_turns.append({'start': turn.start, 'end': turn.end, 'speaker': speaker})
+    return speaker_turns, time.perf_counter() - started
+
+
+def _whisper(pcm_path: str):
+    """Inference worker: Whisper's result with word-level timestamps, and the seconds taken."""
+    if whisper_model is None:
+        return None, 0.0
+    started = time.perf_counter()
+    whisper_result = whisper_model.transcribe(load_waveform(pcm_path), word_timestamps=True)
+    return whisper_result, time.perf_counter() - started
+
+
+def merge_speakers(speaker_turns: list, whisper_result: dict) -> str:
+    """Labels each word with the speaker who overlaps it most and renders the dialogue."""
+    logger.info("Combining transcription and diarization results...")
 
+    # --- Combine Results ---
     word_segments = whisper_result.get('segments', [])
-    
-    for segment in word_segments:
-        if 'words' not in segment: continue
-        for word in segment['words']:
-            word_start = word['start']
-            for turn in speaker_turns:
-                if turn['start'] <= word_start <= turn['end']:
-                    word['speaker'] = turn['speaker']
-                    break
-            if 'speaker' not in word:
-                word['speaker'] = 'UNKNOWN'
+    words = [word for segment in word_segments for word in segment.get('words', [])]
+    for word, speaker in zip(words, assign_speakers(speaker_turns, words)):
+        word['speaker'] = speaker
 
     # --- Format the Final Dialogue ---
     full_transcript = ""
@@ -0,0 +1,96 @@
+import os
+import time
+import resource
+import tempfile
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Compares decoding an upload once for both models (decode_audio plus a
+# memory-mapped load_waveform in each worker) against the two decodes it
+# replaced, Whisper's load_audio and Pyannote's torchaudio.load, on a
+# synthetic recording several hours long. Every stage runs in a fresh
+# process, like the inference workers, so its peak RSS is its own.
+#
+#   python benchmark_decode.py --hours 1
+#   python benchmark_decode.py --audio meeting.mp3
+
+
+def synthetic_recording(path: str, hours: float):
+    """A stereo 128 kbit/s mp3 of `hours` hours of noise, made with ffmpeg."""
+    subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-y", "-f", "lavfi",
+                    "-i", f"anoisesrc=color=pink:sample_rate=44100:duration={hours * 3600}",
+                    "-ac", "2", "-b:a", "128k", path],
+                   check=True, capture_output=True)
+
+
+def whisper_decode(path: str):
+    import whisper
+    return whisper.load_audio(path).sum()
+
+
+def torchaudio_decode(path: str):
+    import torchaudio
+    waveform, _ = torchaudio.load(path)
+    return waveform.sum()
+
+
+def shared_decode(path: str):
+    from app.whisper_utils import decode_audio
+    return decode_audio(path)
+
+
+def shared_map(path: str):
+    from app.whisper_utils import load_waveform
+    # Touch every page, as inference does
+    return load_waveform(f"{path}.f32").sum()
+
+
+def measure(stage, path: str) -> tuple:
+    """Seconds the stage took and its peak RSS in MB, in this process."""
+    started = time.perf_counter()
+    stage(path)
+    elapsed = time.perf_counter() - started
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(stage, path: str) -> tuple:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(measure, stage, path).result()
+
+
+STAGES = (
+    ("before, Whisper's load_audio", whisper_decode),
+    ("before, Pyannote's torchaudio.load", torchaudio_decode),
+    ("after, one decode to the raw file", shared_decode),
+    ("after, mapping it in a worker", shared_map),
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark decoding an upload for both models")
+    parser.add_argument("--hours", type=float, default=1.0, help="length of the synthetic recording")
+    parser.add_argument("--audio", help="benchmark this file instead of a synthetic recording")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.audio
+        if path is None:
+            path = os.path.join(workdir, "recording.mp3")
+            synthetic_recording(path, args.hours)
+        else:
+            # decode_audio writes next to the upload; keep that out of the caller's folder
+            os.symlink(os.path.abspath(path), os.path.join(workdir, os.path.basename(path)))
+            path = os.path.join(workdir, os.path.basename(path))
+
+        results = {}
+        for name, stage in STAGES:
+            results[name] = run(stage, path)
+            print(f"{name:38s} {results[name][0]:6.2f}s, {results[name][1]:6.0f} MB peak RSS")
+        shared_mb = os.path.getsize(f"{path}.f32") / 2 ** 20
+
+    before = results[STAGES[0][0]][0] + results[STAGES[1][0]][0]
+    after = results[STAGES[2][0]][0] + 2 * results[STAGES[3][0]][0]
+    print(f"decode time per recording: {before:.2f}s before, {after:.2f}s after; "
+          f"both workers share {shared_mb:.0f} MB of mapped pages")
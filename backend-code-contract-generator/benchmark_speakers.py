@@ -0,0 +1,99 @@
+import time
+import random
+import argparse
+from collections import defaultdict
+from app.speakers import assign_speakers, UNKNOWN
+
+# Compares the word-to-speaker assignment against the per-word scan it
+# replaced, on synthetic transcripts of meetings several hours long.
+#
+#   python benchmark_speakers.py --hours 1 2 4
+
+
+def synthetic_meeting(hours: float, max_turn: float = 20.0, speakers: int = 6, seed: int = 0,
+                      long_turns: float = 0.1, max_long_turn: float = 120.0):
+    """
+    Diarization turns and Whisper-style words for a meeting of `hours`
+    hours. A `long_turns` share of the turns are monologues of 30 s up to
+    `max_long_turn`, which assign_speakers cuts into pieces.
+    """
+    rng = random.Random(seed)
+    duration = hours * 3600
+    turns, t = [], 0.0
+    while t < duration:
+        if rng.random() < long_turns:
+            length = rng.uniform(30.0, max_long_turn)
+        else:
+            length = rng.uniform(0.5, max_turn)
+        speaker = f"SPEAKER_{rng.randrange(speakers):02d}"
+        turns.append({'start': t, 'end': t + length, 'speaker': speaker})
+        # Speakers sometimes talk over each other, and there are pauses
+        t += length + rng.uniform(-0.3 * length, 1.5)
+    words, t = [], 0.0
+    while t < duration:
+        length = rng.uniform(0.1, 0.6)
+        words.append({'word': ' w', 'start': t, 'end': t + length})
+        t += length + rng.uniform(0.0, 0.3)
+    return turns, words
+
+
+def scan_by_start(speaker_turns, words):
+    """The merge loop this replaced: first turn containing the word's start."""
+    labels = []
+    for word in words:
+        for turn in speaker_turns:
+            if turn['start'] <= word['start'] <= turn['end']:
+                labels.append(turn['speaker'])
+                break
+        else:
+            labels.append(UNKNOWN)
+    return labels
+
+
+def scan_by_overlap(speaker_turns, words):
+    """Maximum-overlap attribution done the slow way, as a reference."""
+    speaker_turns = sorted(speaker_turns, key=lambda turn: turn['start'])
+    labels = []
+    for word in words:
+        overlap = defaultdict(float)
+        first = {}
+        for i, turn in enumerate(speaker_turns):
+            length = min(word['end'], turn['end']) - max(word['start'], turn['start'])
+            if length > 0:
+                overlap[turn['speaker']] += length
+                first.setdefault(turn['speaker'], i)
+        if not overlap:
+            labels.append(UNKNOWN)
+            continue
+        best = max(overlap.values())
+        labels.append(min((s for s in overlap if overlap[s] >= best - 1e-9), key=first.get))
+    return labels
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark word-to-speaker assignment")
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-turn", type=float, default=20.0,
+                        help="longest ordinary turn in seconds; lower it for more, shorter turns")
+    parser.add_argument("--long-turns", type=float, default=0.1,
+                        help="share of turns that are 30 s or longer monologues")
+    parser.add_argument("--check-words", type=int, default=2000,
+                        help="words checked against the slow max-overlap reference")
+    args = parser.parse_args()
+
+    for hours in args.hours:
+        turns, words = synthetic_meeting(hours, args.max_turn, long_turns=args.long_turns)
+        fast, fast_s = timed(assign_speakers, turns, words)
+        _, scan_s = timed(scan_by_start, turns, words)
+        sample = words[:args.check_words]
+        reference = scan_by_overlap(turns, sample)
+        mismatches = sum(a != b for a, b in zip(fast, reference))
+        print(f"{hours:g} h: {len(words)} words, {len(turns)} turns | "
+              f"scan {scan_s:.2f}s, indexed {fast_s:.3f}s ({scan_s / fast_s:.0f}x) | "
+              f"{mismatches}/{len(sample)} differ from the max-overlap reference")
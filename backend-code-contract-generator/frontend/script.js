@@ -44,24 +44,26 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: formData,
             });
 
-            const data = await response.json();
+            const job = await response.json();
+
+            if (!response.ok) {
+                throw new Error(job.detail || 'An unknown server error occurred.');
+            }
+
+            // The server queues the work; wait for the job to finish
+            const data = await waitForJob(job.status_url);
 
             // --- CRITICAL DEBUGGING STEP ---
             // This will print the exact data your browser received to the developer console.
             console.log('Data received from backend:', data);
 
-            if (!response.ok) {
-                throw new Error(data.error || 'An unknown server error occurred.');
-            }
-
             // --- UI Updates: Populate results ---
             // Check if the keys exist before trying to display them
             transcriptText.textContent = data.transcript || "No transcript was returned.";
             contractText.textContent = data.contract_text || "No contract text was returned.";
             
-            if (data.pdf_path) {
-                const backendBaseUrl = 'http://127.0.0.1:8001';
-                pdfDownloadLink.href = backendBaseUrl + data.pdf_path;
+            if (data.pdf_url) {
+                pdfDownloadLink.href = data.pdf_url;
             }
             
             resultsContainer.classList.remove('hidden');
@@ -77,6 +79,25 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Polls a contract job until it finishes; resolves with its result
+    async function waitForJob(statusUrl) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.detail || 'Could not check the job status.');
+            }
+            if (job.status === 'done') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Contract generation failed.');
+            }
+            submitButton.textContent = `Processing... ${job.stage} (${job.progress}%)`;
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     function showError(message) {
         errorText.textContent = message;
         errorMessage.classList.remove('hidden');
@@ -1,18 +1,66 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.whisper_utils import transcribe_audio
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from app.whisper_utils import transcribe_audio, start_inference_pool, stop_inference_pool
 from app.ai_utils import generate_contract
 from app.pdf_utils import save_contract_pdf
-import shutil, os, logging
+from app.jobs import Job, JobQueue, QueueFull
+import shutil, os, logging, asyncio, json, time
 from datetime import datetime
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Voice-to-Contract Generator")
+# How often a progress stream checks its job, and how long it may stay
+# silent before sending a keep-alive comment
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "0.5"))
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+
+
+def process_contract(job: Job, report, audio_path: str, ts: str) -> dict:
+    """Runs on a job worker: transcript → contract → PDF."""
+    timings = {}
+    report("transcribing", 5)
+    transcript = transcribe_audio(audio_path, timings)
+
+    report("generating", 60)
+    started = time.perf_counter()
+    contract_text = generate_contract(transcript)
+    timings["generate"] = time.perf_counter() - started
+
+    report("rendering", 90)
+    started = time.perf_counter()
+    pdf_path = save_contract_pdf(contract_text, filename=f"contract_{ts}_{job.id[:8]}.pdf")
+    timings["render"] = time.perf_counter() - started
+    logger.info(f"PDF saved at {pdf_path}")
+    return {
+        "message": "Contract generated successfully",
+        "transcript": transcript,
+        "contract_text": contract_text,
+        "pdf_filename": os.path.basename(pdf_path),
+        # Seconds per stage; "total" is the transcription wall time
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+    }
+
+
+jobs = JobQueue(process_contract)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the models in every inference worker before taking uploads
+    for worker in await run_in_threadpool(start_inference_pool):
+        logger.info(f"Inference worker ready: {worker}")
+    yield
+    jobs.shutdown()
+    stop_inference_pool()
+
+
+app = FastAPI(title="Voice-to-Contract Generator", lifespan=lifespan)
 
 # CORS — list your actual frontends here
 ALLOWED_ORIGINS = [
@@ -33,44 +81,91 @@ os.makedirs("audio", exist_ok=True)
 os.makedirs("contracts", exist_ok=True)
 
 
-@app.post("/generate_contract/")
+def job_view(request: Request, job: dict) -> dict:
+    """The job as clients see it, with absolute URLs for polling and the PDF."""
+    view = dict(job,
+                status_url=str(request.url_for("job_status", job_id=job["job_id"])),
+                events_url=str(request.url_for("job_events", job_id=job["job_id"])))
+    if job["result"]:
+        # Build absolute URL for frontend
+        contracts_url = request.url_for("contracts", path=job["result"]["pdf_filename"])
+        view["result"] = dict(job["result"], pdf_url=str(contracts_url))
+    return view
+
+
+@app.post("/generate_contract/", status_code=202)
 async def contract_from_audio(request: Request, file: UploadFile = File(...)):
+    """
+    Saves the upload and queues it; the work runs on a job worker. Poll
+    `status_url` or follow `events_url` (server-sent events) for the stage
+    and progress; a finished job's `result` holds the transcript, contract
+    text and PDF URL.
+    """
     try:
         # Save uploaded file with timestamp to avoid collisions
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_name = file.filename.replace("/", "_").replace("\\", "_")
-        audio_path = os.path.join("audio", f"{ts}_{safe_name}")
+        job = Job(safe_name)
+        audio_path = os.path.join("audio", f"{ts}_{job.id[:8]}_{safe_name}")
 
         with open(audio_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
         logger.info(f"Saved upload to {audio_path}")
 
-        # Transcribe → generate contract
-        transcript = transcribe_audio(audio_path)
-        contract_text = generate_contract(transcript)
-
-        # Save PDF (✅ pass only filename, not full path)
-        pdf_filename = f"contract_{ts}.pdf"
-        pdf_path = save_contract_pdf(contract_text, filename=pdf_filename)
-        logger.info(f"PDF saved at {pdf_path}")
-
-        # ✅ Ensure frontend gets just the filename
-        pdf_filename = os.path.basename(pdf_path)
-
-        # Build absolute URL for frontend
-        contracts_url = request.url_for("contracts", path=pdf_filename)
-        return {
-            "message": "Contract generated successfully",
-            "transcript": transcript,
-            "contract_text": contract_text,
-            "pdf_url": str(contracts_url),  # frontend can fetch/download
-            "pdf_filename": pdf_filename,
-        }
-
+        jobs.submit(job, audio_path, ts)
+    except QueueFull as e:
+        os.remove(audio_path)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
     except Exception as e:
-        logger.exception("Error in contract generation")
+        logger.exception("Error queueing contract generation")
         raise HTTPException(status_code=500, detail=str(e))
 
+    _, snapshot = jobs.snapshot(job.id)
+    return job_view(request, snapshot)
+
+
+@app.get("/jobs/{job_id}", name="job_status")
+async def job_status(request: Request, job_id: str):
+    snapshot = jobs.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(request, snapshot[1])
+
+
+@app.get("/jobs/{job_id}/events", name="job_events")
+async def job_events(request: Request, job_id: str):
+    """
+    Server-sent events for one job: a `progress` event whenever its stage
+    or progress changes, then a final `done` or `failed` event with the
+    whole job, after which the stream ends.
+    """
+    if jobs.snapshot(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        seen = None
+        quiet_since = time.monotonic()
+        while True:
+            snapshot = jobs.snapshot(job_id)
+            if snapshot is None:
+                return
+            version, job = snapshot
+            if version != seen:
+                seen = version
+                quiet_since = time.monotonic()
+                finished = job["status"] in ("done", "failed")
+                event = job["status"] if finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job_view(request, job))}\n\n"
+                if finished:
+                    return
+            elif time.monotonic() - quiet_since >= JOB_EVENTS_KEEPALIVE:
+                quiet_since = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 
 @app.get("/download_contract/{filename}")
 async def download_contract(filename: str):
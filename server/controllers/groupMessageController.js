@@ -2,6 +2,8 @@
 const db = require('../db');
 const axios = require('axios');
 
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://localhost:5002';
+
 // @desc    Create a group message and handle @ai tag
 // @route   POST /api/groups/:groupId/messages
 // @access  Private (Group members only)
@@ -40,9 +42,10 @@ const createGroupMessage = async (req, res) => {
             const chat_data = messages.map(msg => `${msg.sender}: ${msg.message_content}`).join('\n');
             
             // Call the AI service
-            const aiServiceResponse = await axios.post('http://localhost:5001/analyze', {
+            const aiServiceResponse = await axios.post(`${AI_SERVICE_URL}/analyze`, {
                 chat_data,
                 user_prompt: message_content,
+                chat_id: `group:${group_id}`,
             });
 
             const ai_response = aiServiceResponse.data.response;
@@ -6,6 +6,16 @@ const axios = require('axios');
 const onlineUsers = new Map();
 // IMPORTANT: Make sure this ID matches your 'AI Assistant' user in the database
 const AI_USER_ID = 3; 
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://localhost:5002';
+// Time budget for an inline @ai reply; the service fits the answer to it
+const AI_REPLY_DEADLINE_MS = Number(process.env.AI_REPLY_DEADLINE_MS) || 20000;
+// Messages sent with an @ai question: the recent window when the chat is
+// indexed for retrieval, the full window when it is not
+const AI_RECENT_MESSAGES = 20;
+const AI_HISTORY_MESSAGES = 50;
+// Latest messages sent for a chat analysis, and indexed when backfilling
+const AI_ANALYSIS_MESSAGES = 100;
+const AI_INDEX_BACKFILL_MESSAGES = Number(process.env.AI_INDEX_BACKFILL_MESSAGES) || 2000;
 
 const initializeSocket = (io) => {
   io.on('connection', (socket) => {
@@ -72,6 +82,11 @@ const initializeSocket = (io) => {
         if (receiverSocketId) io.to(receiverSocketId).emit('new message', message);
         socket.emit('new message', message);
 
+        const [senders] = await db.query('SELECT name FROM users WHERE id = ?', [senderId]);
+        indexMessagesForAI(aiChatId('private', senderId, receiverId), [
+          { id: result.insertId, sender: senders[0].name, content: processedMessage },
+        ]);
+
         if (tagsObject.tags.some(tag => tag.type === 'ai_request')) {
           handleAITagging(senderId, receiverId, processedMessage, 'private', io);
         }
@@ -120,6 +135,10 @@ const initializeSocket = (io) => {
             const roomName = `group_${groupId}`;
             io.to(roomName).emit('new group message', message);
 
+            indexMessagesForAI(aiChatId('group', senderId, groupId), [
+              { id: result.insertId, sender: senderInfo.name, content: processedMessage },
+            ]);
+
             if (tagsObject.tags.some(tag => tag.type === 'ai_request')) {
               handleAITagging(senderId, groupId, processedMessage, 'group', io);
             }
@@ -135,40 +154,17 @@ const initializeSocket = (io) => {
       if (!userId) return;
 
       try {
-        let chatHistory = '';
-        
-        if (chatType === 'private') {
-          const [messages] = await db.query(
-            `SELECT m.*, u.name as sender_name 
-             FROM messages m 
-             JOIN users u ON m.sender_id = u.id 
-             WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-             OR (m.sender_id = ? AND m.receiver_id = ?) 
-             ORDER BY m.timestamp ASC 
-             LIMIT 100`,
-            [userId, chatId, chatId, userId]
-          );
-          chatHistory = messages.map(msg => `${msg.sender_name}: ${msg.message_content}`).join('\n');
-        } else if (chatType === 'group') {
-          const [messages] = await db.query(
-            `SELECT gm.*, u.name as sender_name 
-             FROM group_messages gm 
-             JOIN users u ON gm.sender_id = u.id 
-             WHERE gm.group_id = ? 
-             ORDER BY gm.timestamp ASC 
-             LIMIT 100`,
-            [chatId]
-          );
-          chatHistory = messages.map(msg => `${msg.sender_name}: ${msg.message_content}`).join('\n');
-        }
+        const messages = await fetchChatMessages(chatType, userId, chatId, AI_ANALYSIS_MESSAGES);
+        const chatHistory = messages.map(msg => `${msg.sender}: ${msg.message_content}`).join('\n');
 
-        const aiResponse = await fetch('http://localhost:5002/ask', {
+        const aiResponse = await fetch(`${AI_SERVICE_URL}/ask`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({ 
             history: chatHistory, 
             question: '', 
-            analysis_mode: true 
+            analysis_mode: true,
+            chat_id: aiChatId(chatType, userId, chatId)
           }),
         });
 
@@ -199,6 +195,83 @@ const initializeSocket = (io) => {
   });
 };
 
+// Stable conversation id for the AI service's per-chat summary memory.
+// Private chats are keyed by the sorted user pair so both sides share it.
+function aiChatId(chatType, userId, chatId) {
+  if (chatType === 'private') {
+    const [a, b] = [Number(userId), Number(chatId)].sort((x, y) => x - y);
+    return `private:${a}:${b}`;
+  }
+  return `group:${chatId}`;
+}
+
+// Adds messages to the AI service's per-chat retrieval index, so questions
+// can be answered from relevant older messages. Fire and forget: the service
+// skips ids it already has, and a failure only costs retrieval quality.
+function indexMessagesForAI(chatId, messages, timeout = 10000) {
+  axios.post(`${AI_SERVICE_URL}/messages/index`, {
+    chat_id: chatId,
+    messages: messages.map(msg => ({ id: String(msg.id), text: `${msg.sender}: ${msg.content}` })),
+  }, {
+    timeout,
+  }).catch(error => console.error('Error indexing messages for AI:', error.message));
+}
+
+// The latest `limit` messages of a chat, oldest first, with sender names.
+async function fetchChatMessages(chatType, userId, chatId, limit) {
+  let messages = [];
+  if (chatType === 'private') {
+    [messages] = await db.query(
+      `SELECT m.id, u.name as sender, m.message_content 
+       FROM messages m JOIN users u ON m.sender_id = u.id 
+       WHERE (m.sender_id = ? AND m.receiver_id = ?) 
+       OR (m.sender_id = ? AND m.receiver_id = ?) 
+       ORDER BY m.timestamp DESC 
+       LIMIT ?`,
+      [userId, chatId, chatId, userId, limit]
+    );
+  } else if (chatType === 'group') {
+    [messages] = await db.query(
+      `SELECT gm.id, u.name as sender, gm.message_content 
+       FROM group_messages gm JOIN users u ON gm.sender_id = u.id 
+       WHERE gm.group_id = ? 
+       ORDER BY gm.timestamp DESC 
+       LIMIT ?`,
+      [chatId, limit]
+    );
+  }
+  return messages.reverse();
+}
+
+// Messages in the chat's retrieval index, or null when retrieval is off or
+// the service could not be asked.
+async function aiIndexSize(chatId) {
+  try {
+    const { data } = await axios.get(
+      `${AI_SERVICE_URL}/messages/index/${encodeURIComponent(chatId)}`, { timeout: 2000 }
+    );
+    return data.enabled ? data.size : null;
+  } catch (error) {
+    console.error('Error checking AI message index:', error.message);
+    return null;
+  }
+}
+
+// Indexes the chat's latest messages from the database, for a chat whose
+// index is empty.
+async function backfillAIIndex(aiChat, chatType, userId, chatId) {
+  try {
+    const messages = await fetchChatMessages(chatType, userId, chatId, AI_INDEX_BACKFILL_MESSAGES);
+    if (messages.length) {
+      indexMessagesForAI(aiChat, messages.map(msg => ({
+        id: msg.id, sender: msg.sender, content: msg.message_content,
+      })), 120000);
+    }
+  } catch (error) {
+    console.error('Error backfilling AI message index:', error.message);
+  }
+}
+
 async function processMessageTags(messageContent) {
     const mentionRegex = /@(\w+)/g;
     const tags = [];
@@ -242,39 +315,33 @@ async function handleAITagging(senderId, chatId, messageContent, chatType, io) {
     const user_prompt = messageContent.replace(/@ai\s*/i, '').trim();
     console.log(`🤖 User prompt: "${user_prompt}"`);
     
-    let chat_data = '';
-    
-    if (chatType === 'private') {
-      const [messages] = await db.query(
-        `SELECT u.name as sender, m.message_content 
-         FROM messages m JOIN users u ON m.sender_id = u.id 
-         WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-         OR (m.sender_id = ? AND m.receiver_id = ?) 
-         ORDER BY m.timestamp ASC 
-         LIMIT 50`,
-        [senderId, chatId, chatId, senderId]
-      );
-      chat_data = messages.map(msg => `${msg.sender}: ${msg.message_content}`).join('\n');
-      console.log(`🤖 Chat data fetched: ${messages.length} messages`);
-    } else if (chatType === 'group') {
-      const [messages] = await db.query(
-        `SELECT u.name as sender, gm.message_content 
-         FROM group_messages gm JOIN users u ON gm.sender_id = u.id 
-         WHERE gm.group_id = ? 
-         ORDER BY gm.timestamp ASC 
-         LIMIT 50`,
-        [chatId]
-      );
-      chat_data = messages.map(msg => `${msg.sender}: ${msg.message_content}`).join('\n');
+    // With the chat indexed, only a short recent window is sent and the AI
+    // service adds older messages relevant to the question. The index lives
+    // in the service's memory, so while it is empty (e.g. after a restart)
+    // it is backfilled in the background and the longer window is sent.
+    const aiChat = aiChatId(chatType, senderId, chatId);
+    const indexed = await aiIndexSize(aiChat);
+    if (indexed === 0) {
+      backfillAIIndex(aiChat, chatType, senderId, chatId);
     }
+    const messages = await fetchChatMessages(
+      chatType, senderId, chatId, indexed ? AI_RECENT_MESSAGES : AI_HISTORY_MESSAGES
+    );
+    console.log(`🤖 Chat data fetched: ${messages.length} messages`);
+    const chat_data = messages.map(msg => `${msg.sender}: ${msg.message_content}`).join('\n');
     
-    console.log(`🤖 Sending request to AI service at http://localhost:5001/analyze`);
+    console.log(`🤖 Sending request to AI service at ${AI_SERVICE_URL}/analyze`);
     
-    const aiServiceResponse = await axios.post('http://localhost:5001/analyze', {
+    // /analyze keeps the group-assistant prompt, answers errors with an
+    // error status (handled below), and uses the chat's memory and index
+    const aiServiceResponse = await axios.post(`${AI_SERVICE_URL}/analyze`, {
       chat_data,
       user_prompt,
+      chat_id: aiChat,
     }, {
       timeout: 30000, // 30 second timeout
+      // Ask for an answer sized to arrive well before the timeout
+      headers: { 'X-Deadline-Ms': String(AI_REPLY_DEADLINE_MS) },
     });
 
     console.log(`🤖 AI Service response status: ${aiServiceResponse.status}`);